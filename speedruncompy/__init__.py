@@ -1,2 +1,21 @@
-from .endpoints import *
-from . import api, auth, data_structures, enums, exceptions
\ No newline at end of file
+import importlib
+
+# Submodules and endpoint classes are resolved on first access (PEP 562), so importing speedruncompy for its data
+# structures or exceptions doesn't pull in requests and every endpoint definition.
+_SUBMODULES = {"api", "auth", "data_structures", "endpoints", "enums", "exceptions", "proxies", "singleflight", "ReturnThread"}
+
+def __getattr__(name: str):
+    if name in _SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    if name.startswith("__"): # Introspection probes shouldn't load the endpoints
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    endpoints = importlib.import_module(".endpoints", __name__)
+    endpoint = getattr(endpoints, name, None)
+    if not isinstance(endpoint, type):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = endpoint
+    return endpoint
+
+def __dir__():
+    endpoints = importlib.import_module(".endpoints", __name__)
+    return sorted(set(globals()) | _SUBMODULES | {name for name, value in vars(endpoints).items() if isinstance(value, type)})
@@ -1,10 +1,16 @@
 import base64, json
 from .exceptions import *
+from .proxies import ProxyPool
+from .singleflight import SingleFlight
 import logging
-from ReturnThread import ReturnThread
+import threading
 from requests import Response, get, post, ReadTimeout
-from time import sleep
+from time import sleep, perf_counter
 from typing import Callable, Any
+try:
+    from orjson import loads as decodeJson # Optional, decodes payloads several times faster than json
+except ImportError:
+    from json import loads as decodeJson
 
 API_URI = "https://www.speedrun.com/api/v2/"
 API_V1_URI = "https://www.speedrun.com/api/v1/"
@@ -17,44 +23,43 @@ MAX_ATTEMPTS = 10
 PROXIES = [] # If you set up proxies on Heroku, put their URLs here
 
 cookie = {}
-proxyNum = -1
-usableIPs = []
-usableProxies = []
+proxyPool = None
+proxyPoolLock = threading.Lock()
+inFlight = SingleFlight() # Identical GETs issued concurrently share one round trip
 
 _log = logging.getLogger("speedruncompy")
 _main_log = logging.getLogger("SpeedStats-V2")
 
 def findUsableProxies():
+    global proxyPool
     _main_log.info("Finding usable proxies:")
     
-    proxyIPThreads = {}
-    for proxy in PROXIES:
-        t = ReturnThread(target=getIP, args = (proxy, ))
-        proxyIPThreads[proxy] = t
-        t.start()
-
-    for proxy, t in proxyIPThreads.items():
-        ip = t.join()
-        if ip not in usableIPs:
-            _main_log.info(f"IP of {proxy} is {ip}, which is not in use. Adding.")
-            usableIPs.append(ip)
-            usableProxies.append(proxy)
-        else:
-            _main_log.info(f"IP of {proxy} is {ip}, which already being used. Skipping.")
+    proxyPool = ProxyPool(getIP, PROXIES)
+    numProxies = proxyPool.healthCheck()
+    proxyPool.startHealthChecks()
     
-    _main_log.info(f"Found {len(usableProxies)} proxies.")
-    return len(usableProxies)
+    _main_log.info(f"Found {numProxies} proxies.")
+    return numProxies
 
 def getProxyUri():
     if (not USE_PROXY):
        return ""
     
-    if len(usableProxies) == 0:
-        findUsableProxies()
+    if proxyPool is None:
+        with proxyPoolLock:
+            if proxyPool is None:
+                findUsableProxies()
     
-    global proxyNum
-    proxyNum = (proxyNum + 1) % len(usableProxies)
-    return usableProxies[proxyNum]
+    return proxyPool.select() or ""
+
+def reportProxy(proxy: str, start: float, response: Response = None):
+    """Feeds the outcome of a request back into the proxy pool. Timeouts (no response) and 429s count as failures."""
+    if not proxy or proxyPool is None:
+        return
+    if response is None or response.status_code == 429:
+        proxyPool.reportFailure(proxy)
+    else:
+        proxyPool.reportSuccess(proxy, perf_counter() - start)
 
 def setSessId(phpsessionid):
     global cookie
@@ -75,28 +80,43 @@ def doGet(endpoint: str, params: dict = {}):
     _r = base64.urlsafe_b64encode(paramsjson).replace(b"=", b"")
     _log.debug(f"GET {API_URI}{endpoint} w/ params {paramsjson}")
 
-    attempt = 0
-    while attempt < MAX_ATTEMPTS:
-        try:
-            response = get(url=f"{getProxyUri()}{API_URI}{endpoint}", headers=_header, params={"_r": _r}, timeout=TIMEOUT)
-            return response
-        except Exception:
-            print(f"Attempt {attempt + 1} of {MAX_ATTEMPTS} failed due to timeout. Retrying...")
-            attempt += 1
+    def attemptGet():
+        attempt = 0
+        while attempt < MAX_ATTEMPTS:
+            proxy = getProxyUri()
+            start = perf_counter()
+            try:
+                response = get(url=f"{proxy}{API_URI}{endpoint}", headers=_header, params={"_r": _r}, timeout=TIMEOUT)
+                reportProxy(proxy, start, response)
+                return response
+            except Exception:
+                reportProxy(proxy, start)
+                print(f"Attempt {attempt + 1} of {MAX_ATTEMPTS} failed due to timeout. Retrying...")
+                attempt += 1
+
+    return inFlight.do(("GET", API_URI, endpoint, _r), attemptGet)
 
 def doGetV1(endpoint: str, params: dict = {}):
     _header = {"Accept-Language": LANG, "Accept": ACCEPT}
     paramsjson = bytes(json.dumps(params, separators=(",", ":")).strip(), "utf-8")
     _log.debug(f"GET {API_V1_URI}{endpoint} w/ params {paramsjson}")
-    
-    attempt = 0
-    while attempt < MAX_ATTEMPTS:
-        try:
-            response = get(url=f"{getProxyUri()}{API_V1_URI}{endpoint}{buildParams(params)}", headers=_header, timeout=TIMEOUT)
-            return response
-        except Exception:
-            print(f"Attempt {attempt + 1} of {MAX_ATTEMPTS} failed due to timeout. Retrying...")
-            attempt += 1
+    query = buildParams(params)
+
+    def attemptGet():
+        attempt = 0
+        while attempt < MAX_ATTEMPTS:
+            proxy = getProxyUri()
+            start = perf_counter()
+            try:
+                response = get(url=f"{proxy}{API_V1_URI}{endpoint}{query}", headers=_header, timeout=TIMEOUT)
+                reportProxy(proxy, start, response)
+                return response
+            except Exception:
+                reportProxy(proxy, start)
+                print(f"Attempt {attempt + 1} of {MAX_ATTEMPTS} failed due to timeout. Retrying...")
+                attempt += 1
+
+    return inFlight.do(("GET", API_V1_URI, endpoint, query), attemptGet)
 
 def doPost(endpoint:str, params: dict = {}, _setCookie=True):
     global cookie
@@ -105,10 +125,14 @@ def doPost(endpoint:str, params: dict = {}, _setCookie=True):
 
     attempt = 0
     while attempt < MAX_ATTEMPTS:
+        proxy = getProxyUri()
+        start = perf_counter()
         try:
-            response = post(url=f"{getProxyUri()}{API_URI}{endpoint}", headers=_header, cookies=cookie, json=params, timeout=TIMEOUT)
+            response = post(url=f"{proxy}{API_URI}{endpoint}", headers=_header, cookies=cookie, json=params, timeout=TIMEOUT)
+            reportProxy(proxy, start, response)
             return response
         except Exception:
+            reportProxy(proxy, start)
             print(f"Attempt {attempt + 1} of {MAX_ATTEMPTS} failed due to timeout. Retrying...")
             attempt += 1
 
@@ -162,7 +186,7 @@ class BaseRequest():
                 _log.error(f"Unknown response error returned from SRC! {self.response.status_code} {self.response.content}")
                 raise APIException(self)
 
-            return json.loads(self.response.content)
+            return decodeJson(self.response.content)
         except ServerException as e:
             _log.error(f"ServerException caught: {e}")
             return None
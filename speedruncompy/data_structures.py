@@ -45,4 +45,64 @@ class RunSettings():
         self.video = dict.get("video", 0)
         self.comment = dict.get("comment", "")
         self.date = dict.get("date", "")
-        self.values: list[VariableValue] = dict.get("values", [])
\ No newline at end of file
+        self.values: list[VariableValue] = dict.get("values", [])
+
+class View():
+    """Slotted, read-only projection of an API payload holding only the fields listed in __slots__."""
+    __slots__ = ()
+
+    @classmethod
+    def fromDict(cls, construct: dict):
+        view = cls.__new__(cls)
+        for field, value in zip(cls.__slots__, map(construct.get, cls.__slots__)):
+            setattr(view, field, value)
+        return view
+
+    def __repr__(self) -> str:
+        return str({field: getattr(self, field) for field in self.__slots__})
+
+class NamedView(View):
+    __slots__ = ("id", "name")
+
+class LeaderboardView(View):
+    """A page of GetGameLeaderboard (type 1) or GetGameLeaderboard2 (type 2), normalized to one shape. GetGameRecordHistory
+    payloads share the type 2 shape. Runs and players stay the decoded dicts, since copying hundreds of them per page
+    into view objects costs more than the key lookups it saves."""
+    __slots__ = ("runs", "players", "pages")
+
+    @classmethod
+    def fromPayload(cls, payload: dict, type: int):
+        if type == 1:
+            payload = payload["leaderboard"]
+            runs, players = payload["runs"], payload["players"]
+        else:
+            runs, players = payload["runList"], payload["playerList"]
+        view = cls.__new__(cls)
+        view.runs = runs
+        view.players = players
+        view.pages = payload["pagination"]["pages"] if "pagination" in payload else 1
+        return view
+
+class SubcategoryValueView(View):
+    __slots__ = ("id", "name", "variableId")
+
+class CategoryView(View):
+    __slots__ = ("id", "name", "timeDirection")
+
+class GameDataView(View):
+    """The parts of a GetGameData payload the crawler needs. Only subcategory variables and their values are kept."""
+    __slots__ = ("name", "defaultTimer", "levels", "platforms", "subcategories", "subcategoryValues", "categories")
+
+    @classmethod
+    def fromPayload(cls, payload: dict):
+        subcategories = [variable for variable in payload["variables"] if variable["isSubcategory"] == True]
+        subcategoryIds = {variable["id"] for variable in subcategories}
+        view = cls.__new__(cls)
+        view.name = payload["game"].get("name")
+        view.defaultTimer = payload["game"]["defaultTimer"]
+        view.levels = [NamedView.fromDict(level) for level in payload["levels"]]
+        view.platforms = [NamedView.fromDict(platform) for platform in payload["platforms"]]
+        view.subcategories = [NamedView.fromDict(variable) for variable in subcategories]
+        view.subcategoryValues = [SubcategoryValueView.fromDict(value) for value in payload["values"] if value["variableId"] in subcategoryIds]
+        view.categories = [CategoryView.fromDict(category) for category in payload["categories"]]
+        return view
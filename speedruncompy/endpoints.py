@@ -33,7 +33,7 @@ class GetGameRecordHistory(GetRequest):
         param_construct["params"].update(params)
         if page is not None: 
             param_construct["page"] = page
-        super().__init__("GetGameLeaderboard2", **param_construct)
+        super().__init__("GetGameRecordHistory", **param_construct)
 
 class GetLatestLeaderboard(GetRequest):
     def __init__(self, **params) -> None:
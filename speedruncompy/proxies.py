@@ -0,0 +1,138 @@
+import logging
+import random
+import threading
+from time import monotonic, perf_counter, sleep
+from typing import Callable, Optional
+
+from .ReturnThread import ReturnThread
+
+_main_log = logging.getLogger("SpeedStats-V2")
+
+HEALTH_CHECK_INTERVAL = 300 # Seconds between background health checks
+READMIT_DELAY = 120 # Seconds an ejected proxy waits before it is probed again
+MAX_FAILURES = 3 # Consecutive timeouts/429s before a proxy is ejected
+LATENCY_SMOOTHING = 0.2 # Weight of the newest sample in the latency moving average
+
+class ProxyState():
+    __slots__ = ("uri", "ip", "latency", "failures", "healthy", "ejectedAt")
+
+    def __init__(self, uri: str) -> None:
+        self.uri = uri
+        self.ip = None
+        self.latency = None
+        self.failures = 0
+        self.healthy = False
+        self.ejectedAt = None
+
+class ProxyPool():
+    """Health-scored pool of proxies. Selection is weighted by inverse latency and is thread-safe.
+
+    Proxies that time out or get rate limited `MAX_FAILURES` times in a row are ejected, then re-admitted
+    by the health check once a probe succeeds again.
+    """
+    def __init__(self, probe: Callable[[str], str], proxies: list = []) -> None:
+        self.probe = probe
+        self._lock = threading.Lock()
+        self._proxies: dict[str, ProxyState] = {uri: ProxyState(uri) for uri in proxies}
+        self._healthThread = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(1 for state in self._proxies.values() if state.healthy)
+
+    def select(self) -> Optional[str]:
+        with self._lock:
+            healthy = [state for state in self._proxies.values() if state.healthy]
+            if len(healthy) == 0:
+                # Everything is ejected; keep crawling through the proxy that has been out the longest
+                ejected = [state for state in self._proxies.values() if state.ejectedAt is not None]
+                if len(ejected) == 0:
+                    return None
+                return min(ejected, key=lambda state: state.ejectedAt).uri
+            weights = [1 / max(state.latency or 1.0, 0.001) for state in healthy]
+            return random.choices(healthy, weights=weights)[0].uri
+
+    def reportSuccess(self, uri: str, latency: float):
+        with self._lock:
+            state = self._proxies.get(uri)
+            if state is None:
+                return
+            state.failures = 0
+            if state.latency is None:
+                state.latency = latency
+            else:
+                state.latency += LATENCY_SMOOTHING * (latency - state.latency)
+
+    def reportFailure(self, uri: str):
+        with self._lock:
+            state = self._proxies.get(uri)
+            if state is None:
+                return
+            state.failures += 1
+            if state.healthy and state.failures >= MAX_FAILURES:
+                state.healthy = False
+                state.ejectedAt = monotonic()
+                _main_log.warning(f"Ejecting proxy {uri} after {state.failures} consecutive failures.")
+
+    def _probe(self, uri: str):
+        start = perf_counter()
+        try:
+            return self.probe(uri), perf_counter() - start
+        except Exception:
+            return None, None
+
+    def healthCheck(self):
+        """Probes every healthy proxy and every ejected proxy whose readmission delay has passed."""
+        now = monotonic()
+        with self._lock:
+            candidates = [state.uri for state in self._proxies.values()
+                          if state.healthy or state.ejectedAt is None or now - state.ejectedAt >= READMIT_DELAY]
+
+        probeThreads = {}
+        for uri in candidates:
+            t = ReturnThread(target=self._probe, args=(uri, ))
+            probeThreads[uri] = t
+            t.start()
+        results = {uri: t.join() for uri, t in probeThreads.items()}
+
+        with self._lock:
+            usedIPs = {}
+            # Fastest proxies claim their IP first so duplicates keep the best route
+            for uri, (ip, latency) in sorted(results.items(), key=lambda item: item[1][1] if item[1][1] is not None else float('inf')):
+                state = self._proxies[uri]
+                if ip is None:
+                    if state.healthy or state.ejectedAt is None:
+                        _main_log.warning(f"Health check of proxy {uri} failed. Ejecting.")
+                    state.healthy = False
+                    state.ejectedAt = now
+                    continue
+                if ip in usedIPs and usedIPs[ip] != uri:
+                    if state.healthy or state.ejectedAt is None:
+                        _main_log.info(f"IP of {uri} is {ip}, which is already being used by {usedIPs[ip]}. Skipping.")
+                    state.healthy = False
+                    state.ejectedAt = now
+                    continue
+                if not state.healthy:
+                    _main_log.info(f"IP of {uri} is {ip}, which is not in use. Adding.")
+                usedIPs[ip] = uri
+                state.ip = ip
+                state.latency = latency if state.latency is None else state.latency + LATENCY_SMOOTHING * (latency - state.latency)
+                state.failures = 0
+                state.healthy = True
+                state.ejectedAt = None
+        return len(self)
+
+    def startHealthChecks(self, interval: float = HEALTH_CHECK_INTERVAL):
+        if self._healthThread is not None:
+            return
+
+        def loop():
+            while True:
+                sleep(interval)
+                try:
+                    self.healthCheck()
+                except Exception as e:
+                    _main_log.error(f"Proxy health check failed: {e}")
+
+        self._healthThread = threading.Thread(target=loop, name="ProxyHealthCheck", daemon=True)
+        self._healthThread.start()
@@ -0,0 +1,44 @@
+import threading
+from typing import Any, Callable, Hashable
+
+class _Call():
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight():
+    """Coalesces concurrent calls sharing a key: the first caller performs the call, the rest wait for its result.
+
+    Only calls that overlap in time are shared, nothing is cached once the leading call returns.
+    """
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            isLeader = call is None
+            if isLeader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not isLeader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
@@ -1,5 +0,0 @@
-from scraperunsv2 import *
-from processruns import *
-
-testSeries('data/redball.json', "xn02m872", 'Red Ball')
-processRuns('data/redball.json', 'data/redball.csv', False)
\ No newline at end of file
@@ -0,0 +1,25 @@
+import importlib
+
+# Public name -> submodule that defines it. Nothing is imported until a name is first used, so embedding
+# speedstats only pays for the stages it runs; importing it never touches logging handlers or stdio.
+_EXPORTS = {
+    'exploreAll': 'scraperunsv2',
+    'testSeries': 'scraperunsv2',
+    'testGame': 'scraperunsv2',
+    'processRuns': 'processruns',
+    'refreshGames': 'refresh',
+    'refreshSeries': 'refresh',
+    'HistoryStore': 'history',
+    'PlayerIndex': 'playerindex',
+}
+
+def __getattr__(name: str):
+    moduleName = _EXPORTS.get(name)
+    if moduleName == None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{moduleName}', __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
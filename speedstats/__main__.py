@@ -0,0 +1,130 @@
+import argparse
+import logging
+import sys
+from .runshards import CODECS, DEFAULT_CODEC
+
+LOG_PATH = 'logs/output.log'
+
+def configureLogging(logPath: str = LOG_PATH):
+    """Process-wide setup for command line runs. Library code only logs to 'SpeedStats-V2' and leaves this to the caller."""
+    sys.stdin.reconfigure(encoding="utf-8")
+    sys.stdout.reconfigure(encoding="utf-8")
+    sys.stderr.reconfigure(encoding="utf-8")
+
+    _log = logging.getLogger('SpeedStats-V2')
+    _log.setLevel(logging.DEBUG)
+
+    fh = logging.FileHandler(logPath, mode='w', encoding = 'utf-8')
+    fh.setLevel(logging.DEBUG)
+
+    ch = logging.StreamHandler()
+    ch.setLevel(logging.DEBUG)
+
+    _log.addHandler(fh)
+    _log.addHandler(ch)
+
+def runAll(args):
+    from .scraperunsv2 import exploreAll
+    from .processruns import processRuns
+    exploreAll(args.json, resume = args.resume, merge = args.merge, codec = args.codec, obsolete = not args.current_only,
+               bulkMetadata = not args.no_bulk_metadata)
+    processRuns(args.json, args.csv, args.no_export, historyPath = args.history, workers = args.workers)
+
+def runTest(args):
+    from .scraperunsv2 import testSeries
+    from .processruns import processRuns
+    testSeries(args.json, args.series_id, args.series_name)
+    processRuns(args.json, args.csv, args.no_export, workers = args.workers)
+
+def runCrawl(args):
+    from .scraperunsv2 import exploreAll
+    exploreAll(args.json, resume = args.resume, merge = args.merge, codec = args.codec, obsolete = not args.current_only,
+               bulkMetadata = not args.no_bulk_metadata)
+
+def runProcess(args):
+    from .processruns import processRuns
+    processRuns(args.json, args.csv, args.no_export, profile = args.profile, traceMemory = args.trace_memory, historyPath = args.history,
+                workers = args.workers)
+
+def runRefresh(args):
+    from .refresh import refreshGames, refreshSeries
+    if args.series:
+        refreshSeries(args.json, args.ids, args.csv, args.no_export)
+    else:
+        refreshGames(args.json, args.ids, args.csv, args.no_export)
+
+def runCoordinator(args):
+    from .distributed import Coordinator
+    coordinator = Coordinator(args.json, args.queue, obsolete = not args.current_only, codec = args.codec, secret = args.secret)
+    coordinator.serve(args.host, args.port, args.merge)
+
+def runWorker(args):
+    from .distributed import Worker
+    Worker(args.coordinator, args.threads, args.secret).run()
+
+def addCrawlArguments(command: argparse.ArgumentParser):
+    command.add_argument('--resume', action='store_true', help='skip games already in the shard directory')
+    command.add_argument('--codec', choices=CODECS, default=DEFAULT_CODEC, help='compression for new run shards')
+    command.add_argument('--merge', action='store_true', help='also merge the shards into a plain runs.json')
+    command.add_argument('--current-only', action='store_true', help='skip obsolete runs and take WR counts from record histories')
+    command.add_argument('--no-bulk-metadata', action='store_true', help='revalidate cached games with GetGameData only')
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(prog='python -m speedstats', description='Crawls speedrun.com and builds the SpeedStats tables.')
+    parser.add_argument('--log', default=LOG_PATH, help='log file, truncated on every run')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def addCommand(name: str, function, help: str, json: str, csv: str = None, processes: bool = True):
+        command = commands.add_parser(name, help=help)
+        command.set_defaults(function=function)
+        command.add_argument('--json', default=json, help='runs.json file or shard directory')
+        if csv != None:
+            command.add_argument('--csv', default=csv)
+            command.add_argument('--no-export', action='store_true', help="don't load the results into the database")
+        if processes:
+            command.add_argument('--workers', type=int, default=None, help='processes decoding run shards, one per core by default')
+        return command
+
+    command = addCommand('all', runAll, 'crawl every series and game, then process and export the runs', 'data/runs.json', 'data/runs.csv')
+    addCrawlArguments(command)
+    command.add_argument('--history', default='data/history', help='snapshot history directory')
+
+    command = addCommand('test', runTest, 'crawl and process a single series', 'data/redball.json', 'data/redball.csv')
+    command.add_argument('--series-id', default='xn02m872')
+    command.add_argument('--series-name', default='Red Ball')
+
+    command = addCommand('crawl', runCrawl, 'crawl every series and game without processing', 'data/runs.json', processes = False)
+    addCrawlArguments(command)
+
+    command = addCommand('coordinator', runCoordinator, 'serve a distributed crawl to workers and write its shards', 'data/runs.json',
+                         processes = False)
+    command.add_argument('--queue', default='data/queue.db', help='work queue database, reused to resume a crawl')
+    command.add_argument('--host', default='0.0.0.0')
+    command.add_argument('--port', type=int, default=8765)
+    command.add_argument('--secret', default=None, help='shared secret workers must send')
+    command.add_argument('--codec', choices=CODECS, default=DEFAULT_CODEC, help='compression for run shards')
+    command.add_argument('--merge', action='store_true', help='also merge the shards into a plain runs.json')
+    command.add_argument('--current-only', action='store_true', help='skip obsolete runs and take WR counts from record histories')
+
+    command = commands.add_parser('worker', help='crawl units handed out by a coordinator')
+    command.set_defaults(function=runWorker)
+    command.add_argument('coordinator', help='coordinator URL, e.g. http://crawlhost:8765')
+    command.add_argument('--threads', type=int, default=2)
+    command.add_argument('--secret', default=None)
+
+    command = addCommand('process', runProcess, 'process and export an existing crawl', 'data/runs.json', 'data/runs.csv')
+    command.add_argument('--history', default=None, help='also save a snapshot to this history directory')
+    command.add_argument('--profile', action='store_true', help='write cProfile stats next to the CSV')
+    command.add_argument('--trace-memory', action='store_true', help='record tracemalloc peaks per stage')
+
+    command = addCommand('refresh', runRefresh, 're-crawl specific games or series into an existing crawl', 'data/runs.json', 'data/refresh.csv',
+                         processes = False)
+    command.add_argument('--series', action='store_true', help='treat ids as series ids')
+    command.add_argument('ids', nargs='+')
+
+    args = parser.parse_args(argv)
+    configureLogging(args.log)
+    args.function(args)
+
+if __name__ == '__main__':
+    main()
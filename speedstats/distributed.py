@@ -0,0 +1,356 @@
+import gzip
+import json
+import logging
+import os
+import socket
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Thread
+from time import sleep, monotonic
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from . import scraperunsv2 as scraper
+from .metadatacache import trimGameData
+from .runshards import DEFAULT_CODEC, ShardWriter, shardDirectory, mergeShards
+from .workerstate import ShardedRegistry, WorkerBuffer
+from .workqueue import LeaseQueue
+
+_log = logging.getLogger('SpeedStats-V2')
+
+QUEUE_PATH = 'data/queue.db'
+DEFAULT_PORT = 8765
+POLL_INTERVAL = 5 # Seconds an idle worker waits before asking for work again, and between coordinator progress checks
+PROGRESS_INTERVAL = 60 # Seconds between coordinator progress logs
+MAX_RETRIES = 10 # Failed calls to the coordinator before a worker gives up
+REQUEST_TIMEOUT = 60 # Seconds before a call to the coordinator counts as failed
+HEARTBEATS_PER_LEASE = 3 # Lease extensions a worker sends per lease period while it crawls a unit
+SECRET_HEADER = 'X-SpeedStats-Secret'
+
+# Unit kinds. A game unit loads the game's metadata and queues page 1 of each category; page 1 queues the category's
+# remaining pages once their count is known. When obsolete runs are skipped, every page also queues the record history
+# of each leaderboard it found runs for.
+GAME = 'game'
+PAGE = 'page'
+HISTORY = 'history'
+
+def encode(value) -> bytes:
+    return gzip.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'), compresslevel = 6)
+
+def decode(data: bytes):
+    return json.loads(gzip.decompress(data))
+
+class Coordinator:
+    """Owns the durable work queue of a distributed crawl and serves it to workers over HTTP. Workers upload each
+    unit's runs as gzipped JSON, and once the queue drains they are written to shards next to `path` like exploreAll
+    does, with the workers' game metadata merged into the metadata cache."""
+    def __init__(self, path: str, queuePath: str = QUEUE_PATH, obsolete: bool = True, codec: str = DEFAULT_CODEC, secret: str = None):
+        self.path = path
+        self.queue = LeaseQueue(queuePath)
+        self.obsolete = obsolete
+        self.codec = codec
+        self.secret = secret
+
+    def seed(self):
+        """Queues a unit per game, unless the queue was already seeded by an earlier run that is being resumed."""
+        if self.queue.getSetting('seeded') != None:
+            _log.info(f"Resuming queue {self.queue.path} with units {self.queue.counts()}")
+            return
+        scraper.openMetadataCache()
+        seriesQueue = scraper.explorePages('series', scraper.GetSeriesList, 'seriesList')
+        gameQueue = scraper.exploreList(seriesQueue, scraper.series, scraper.exploreSeries) # Series games first, like exploreAll
+        gameQueue.extend(scraper.explorePages('games', scraper.GetGameList, 'gameList'))
+        units = [(f"{GAME}:{gameOverview['id']}", GAME, 0, gameOverview['id'], json.dumps(gameOverview))
+                 for gameOverview in gameQueue if gameOverview['id'] not in scraper.excludedGames]
+        added = self.queue.put(units)
+        self.queue.setSetting('series', json.dumps(dict(scraper.series)))
+        self.queue.setSetting('seeded', '1')
+        _log.info(f"Seeded {self.queue.path} with {added} games")
+
+    def claim(self, worker: str):
+        unit = self.queue.claim(worker)
+        if unit == None:
+            return {'unit': None, 'done': self.queue.isDrained()}
+        unit['payload'] = json.loads(unit['payload'])
+        unit['leaseSeconds'] = self.queue.leaseSeconds
+        return {'unit': unit}
+
+    def followUps(self, unit: dict, result: dict):
+        payload = json.loads(unit['payload'])
+        units = []
+        if unit['kind'] == GAME:
+            series = json.loads(self.queue.getSetting('series'))
+            categoryOverviews = [categoryOverview for categoryOverview in result['categories']
+                                 if categoryOverview['id'] not in scraper.excludedCategories]
+            knownPages = scraper.metadataCache.getCategoryPages([categoryOverview['id'] for categoryOverview in categoryOverviews])
+            for categoryOverview in categoryOverviews:
+                pagePayload = {'category': categoryOverview, 'page': 1, 'gameName': payload['name'],
+                               'seriesName': series.get(payload.get('seriesId')), 'obsolete': self.obsolete}
+                priority = -knownPages.get(categoryOverview['id'], 1)
+                units.append((f"{PAGE}:{categoryOverview['id']}:1", PAGE, priority, unit['groupKey'], json.dumps(pagePayload)))
+        elif unit['kind'] == PAGE:
+            categoryId = payload['category']['id']
+            if payload['page'] == 1:
+                for page in range(2, result['pages'] + 1): # On the leaderboard type page 1 used, which its page count is from
+                    units.append((f"{PAGE}:{categoryId}:{page}", PAGE, -result['pages'], unit['groupKey'],
+                                  json.dumps(dict(payload, page = page, type = result['type']))))
+            for levelId, valueIds in result.get('leaderboards', []): # Duplicate keys from other pages are ignored by the queue
+                historyPayload = dict(payload, category = dict(payload['category'], levelId = levelId, valueIds = valueIds))
+                units.append((f"{HISTORY}:{categoryId}:{levelId or ''}:{','.join(valueIds)}", HISTORY, -result['pages'], unit['groupKey'],
+                               json.dumps(historyPayload)))
+        return units
+
+    def complete(self, unitId: int, token: str, data: bytes):
+        unit = self.queue.unit(unitId)
+        if unit == None:
+            return False
+        return self.queue.complete(unitId, token, data, self.followUps(unit, decode(data)))
+
+    def gameData(self, gameId: str):
+        return self.queue.result(f"{GAME}:{gameId}")
+
+    def finish(self, merge: bool = False):
+        """Writes the uploaded runs to shards, GAME_BATCH_SIZE games each, and stores the merged game metadata."""
+        counts = self.queue.counts()
+        if counts.get('failed', 0) > 0:
+            _log.error(f"{counts['failed']} units failed, their runs are missing from this crawl")
+        seriesNames = json.loads(self.queue.getSetting('series'))
+        wrCounts = {}
+        for gameId in self.queue.groupKeys(HISTORY):
+            for _, result in self.queue.groupResults(HISTORY, gameId):
+                wrCounts.update(decode(result)['wrCounts'])
+
+        shardWriter = ShardWriter(shardDirectory(self.path), codec = self.codec, obsolete = self.obsolete)
+        crawledPages = {}
+        rows = []
+        batchGameOverviews = []
+        for gameId in self.queue.groupKeys(GAME):
+            for payload, result in self.queue.groupResults(GAME, gameId):
+                batchGameOverviews.append(json.loads(payload))
+                game = decode(result)['game']
+                if game != None:
+                    scraper.metadataCache.storeGame(gameId, game)
+            for payload, result in self.queue.groupResults(PAGE, gameId):
+                pageResult = decode(result)
+                rows.extend(pageResult['rows'])
+                if json.loads(payload)['page'] == 1:
+                    crawledPages[json.loads(payload)['category']['id']] = pageResult['pages']
+            if len(batchGameOverviews) >= scraper.GAME_BATCH_SIZE:
+                shardWriter.write(rows, batchGameOverviews, seriesNames, wrCounts)
+                rows, batchGameOverviews = [], []
+        if len(batchGameOverviews) > 0:
+            shardWriter.write(rows, batchGameOverviews, seriesNames, wrCounts)
+
+        scraper.metadataCache.storeCategoryPages(crawledPages)
+        if merge:
+            mergeShards(shardWriter.directory, self.path)
+
+    def serve(self, host: str = '0.0.0.0', port: int = DEFAULT_PORT, merge: bool = False):
+        """Seeds the queue, serves it until every unit is done or failed, then writes the shards."""
+        self.seed()
+        if scraper.metadataCache == None:
+            scraper.openMetadataCache()
+        server = ThreadingHTTPServer((host, port), makeHandler(self))
+        Thread(target = server.serve_forever, daemon = True).start()
+        _log.info(f"Coordinator listening on {host}:{port}")
+
+        lastProgress = monotonic()
+        while not self.queue.isDrained():
+            sleep(POLL_INTERVAL)
+            if monotonic() - lastProgress >= PROGRESS_INTERVAL:
+                _log.info(f"Queue progress: {self.queue.counts()}")
+                lastProgress = monotonic()
+        self.finish(merge) # Still serving, so polling workers learn the crawl is done
+        sleep(2 * POLL_INTERVAL)
+        server.shutdown()
+        server.server_close()
+
+def makeHandler(coordinator: Coordinator):
+    class CoordinatorHandler(BaseHTTPRequestHandler):
+        def respond(self, status: int, body: bytes = b'', contentType: str = 'application/json'):
+            self.send_response(status)
+            self.send_header('Content-Type', contentType)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def authorized(self):
+            if coordinator.secret != None and self.headers.get(SECRET_HEADER) != coordinator.secret:
+                self.respond(403)
+                return False
+            return True
+
+        def readBody(self):
+            return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        def do_GET(self):
+            if not self.authorized():
+                return
+            parts = urlsplit(self.path).path.strip('/').split('/')
+            if len(parts) == 2 and parts[0] == GAME:
+                data = coordinator.gameData(parts[1])
+                self.respond(200, data, 'application/gzip') if data != None else self.respond(404)
+            else:
+                self.respond(404)
+
+        def do_POST(self):
+            if not self.authorized():
+                return
+            url = urlsplit(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            try:
+                if url.path == '/claim':
+                    self.respond(200, json.dumps(coordinator.claim(query['worker'])).encode('utf-8'))
+                elif url.path == '/complete':
+                    accepted = coordinator.complete(int(query['id']), query['token'], self.readBody())
+                    self.respond(200 if accepted else 409)
+                elif url.path == '/extend':
+                    self.respond(200 if coordinator.queue.extend(int(query['id']), query['token']) else 409)
+                elif url.path == '/fail':
+                    coordinator.queue.fail(int(query['id']), query['token'])
+                    self.respond(200)
+                else:
+                    self.respond(404)
+            except Exception as e:
+                _log.error(f"Coordinator failed to handle {self.path}", exc_info=e)
+                self.respond(500)
+
+        def log_message(self, format: str, *args):
+            _log.debug(f"{self.address_string()} {format % args}")
+
+    return CoordinatorHandler
+
+class Worker:
+    """Claims units from a coordinator and crawls them with the scraperunsv2 functions, on `threads` threads. Each
+    thread uploads exactly the runs it built for the unit it holds, taken from its own worker buffer."""
+    def __init__(self, coordinatorUri: str, threads: int = scraper.CONCURRENT_THREADS, secret: str = None, name: str = None):
+        self.coordinatorUri = coordinatorUri.rstrip('/')
+        self.threads = threads
+        self.secret = secret
+        self.name = name or f"{socket.gethostname()}-{os.getpid()}"
+        self.knownGames = ShardedRegistry() # Games whose names are registered in this process
+
+    def call(self, method: str, path: str, query: dict = {}, body: bytes = None):
+        url = f"{self.coordinatorUri}{path}" + (f"?{urlencode(query)}" if len(query) > 0 else '')
+        headers = {SECRET_HEADER: self.secret} if self.secret != None else {}
+        for attempt in range(MAX_RETRIES):
+            try:
+                request = urllib.request.Request(url, data = body, headers = headers, method = method)
+                with urllib.request.urlopen(request, timeout = REQUEST_TIMEOUT) as response:
+                    return response.read()
+            except urllib.error.HTTPError:
+                raise
+            except (urllib.error.URLError, TimeoutError) as e:
+                _log.warning(f"Call {attempt + 1} of {MAX_RETRIES} to {url} failed: {e}")
+                sleep(POLL_INTERVAL)
+        raise ConnectionError(f"Coordinator at {self.coordinatorUri} is unreachable")
+
+    def registerGame(self, gameOverview: dict, game: dict):
+        """Makes the game's names available to Run, returning its category overviews."""
+        buffer = WorkerBuffer()
+        categoryOverviews = scraper.registerGame(gameOverview, game, buffer)
+        scraper.levels.update(buffer.levels)
+        scraper.platforms.update(buffer.platforms)
+        scraper.subcategories.update(buffer.subcategories)
+        scraper.subcategoryValues.update(buffer.subcategoryValues)
+        scraper.subcategoryVariables.update(buffer.subcategoryVariables)
+        scraper.games[gameOverview['id']] = gameOverview['name'].strip()
+        self.knownGames[gameOverview['id']] = True
+        return categoryOverviews
+
+    def ensureGame(self, payload: dict):
+        categoryOverview = payload['category']
+        gameId = categoryOverview['gameId']
+        with self.knownGames.lockFor(gameId):
+            if gameId not in self.knownGames:
+                game = decode(self.call('GET', f'/{GAME}/{gameId}'))['game']
+                self.registerGame({'id': gameId, 'name': payload['gameName'], 'seriesId': categoryOverview['seriesId']}, game)
+        if categoryOverview['seriesId'] != None:
+            scraper.series[categoryOverview['seriesId']] = payload['seriesName']
+        scraper.categories[categoryOverview['id']] = categoryOverview['name'].strip()
+
+    def crawlGame(self, gameOverview: dict):
+        game = scraper.loadGameData(gameOverview)
+        if game == None:
+            return {'game': None, 'categories': []}
+        game = trimGameData(game)
+        with self.knownGames.lockFor(gameOverview['id']):
+            categoryOverviews = self.registerGame(gameOverview, game)
+        return {'game': game, 'categories': categoryOverviews}
+
+    def crawlPage(self, payload: dict):
+        self.ensureGame(payload)
+        type = payload.get('type') or scraper.leaderboardRouter.choose() # Chosen on page 1, then kept for the category
+        leaderboards = set() if not payload['obsolete'] else None
+        pages = scraper.exploreLeaderboard(payload['category'], page = payload['page'], type = type, obsolete = payload['obsolete'],
+                                           leaderboards = leaderboards)
+        buffer = scraper.workerBuffers.get()
+        return {'pages': pages, 'type': type, 'rows': [run.toRow() for run in buffer.runs],
+                'leaderboards': sorted(leaderboards or (), key = str)}
+
+    def crawlHistory(self, payload: dict):
+        self.ensureGame(payload)
+        scraper.exploreRecordHistory(payload['category'])
+        return {'wrCounts': scraper.countWRs(scraper.workerBuffers.get().recordRuns)}
+
+    def keepLease(self, lease: dict, leaseSeconds: float, stop: Event):
+        """Extends a unit's lease until `stop` is set, so units that take longer than a lease (e.g. through request
+        retries) aren't handed to another worker."""
+        while not stop.wait(leaseSeconds / HEARTBEATS_PER_LEASE):
+            try:
+                self.call('POST', '/extend', lease)
+            except (urllib.error.HTTPError, ConnectionError) as e:
+                _log.warning(f"Couldn't extend the lease on unit {lease['id']}: {e}")
+                return
+
+    def work(self):
+        crawlers = {GAME: self.crawlGame, PAGE: self.crawlPage, HISTORY: self.crawlHistory}
+        while True:
+            try:
+                response = json.loads(self.call('POST', '/claim', {'worker': self.name}))
+            except urllib.error.HTTPError as e:
+                if e.code < 500:
+                    raise
+                _log.warning(f"Coordinator couldn't hand out a unit: {e}")
+                sleep(POLL_INTERVAL)
+                continue
+            except ConnectionError as e: # Finished and shut down, or gone
+                _log.warning(f"Stopping: {e}")
+                return
+            unit = response['unit']
+            if unit == None:
+                if response['done']:
+                    return
+                sleep(POLL_INTERVAL)
+                continue
+            lease = {'id': unit['id'], 'token': unit['token']}
+            stopHeartbeat = Event()
+            heartbeat = Thread(target = self.keepLease, args = (lease, unit['leaseSeconds'], stopHeartbeat), daemon = True)
+            heartbeat.start()
+            buffer = scraper.workerBuffers.get() # Emptied per unit, so nothing a failed unit left behind is uploaded with this one
+            buffer.runs, buffer.recordRuns = [], []
+            try:
+                result = crawlers[unit['kind']](unit['payload'])
+            except Exception as e:
+                _log.error(f"Failed {unit['kind']} unit {unit['id']}", exc_info=e)
+                self.call('POST', '/fail', lease)
+                continue
+            finally:
+                stopHeartbeat.set()
+                heartbeat.join()
+            try:
+                self.call('POST', '/complete', lease, encode(result))
+            except urllib.error.HTTPError as e: # The unit is retried once its lease expires
+                if e.code == 409:
+                    _log.warning(f"Lost the lease on {unit['kind']} unit {unit['id']}, discarding its result")
+                else:
+                    _log.error(f"Coordinator rejected {unit['kind']} unit {unit['id']}: {e}")
+
+    def run(self):
+        scraper.openMetadataCache()
+        _log.info(f"Worker {self.name} crawling for {self.coordinatorUri} on {self.threads} threads")
+        threads = [Thread(target = self.work) for _ in range(self.threads)]
+        for t in threads:
+            t.start()
+        scraper.joinThreads(threads)
+        scraper.leaderboardRouter.logStats()
@@ -0,0 +1,100 @@
+import bisect
+import gzip
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+from functools import lru_cache
+from types import MappingProxyType
+
+_log = logging.getLogger('SpeedStats-V2')
+
+HISTORY_PATH = 'data/history'
+
+def encodeGroup(runs: list):
+    """Canonical bytes for a group's runs, independent of the order the crawler found them in."""
+    encodedRuns = sorted(json.dumps(run, sort_keys=True, separators=(',', ':')) for run in runs)
+    return ('[' + ','.join(encodedRuns) + ']').encode('utf-8')
+
+class HistoryStore:
+    """Stores every crawl as a snapshot mapping group names to content-addressed, gzipped chunks of their runs.
+
+    A leaderboard that didn't change between crawls points at the same chunk, so each snapshot only costs the
+    groups that changed plus its index.
+    """
+    def __init__(self, directory: str = HISTORY_PATH):
+        self.directory = directory
+        self.chunkDirectory = os.path.join(directory, 'chunks')
+        self.snapshotDirectory = os.path.join(directory, 'snapshots')
+        os.makedirs(self.chunkDirectory, exist_ok = True)
+        os.makedirs(self.snapshotDirectory, exist_ok = True)
+        self.loadSnapshot = lru_cache(maxsize = 8)(self.loadSnapshot)
+        self.readChunk = lru_cache(maxsize = 1024)(self.readChunk)
+
+    def chunkPath(self, digest: str):
+        return os.path.join(self.chunkDirectory, digest[:2], f'{digest[2:]}.json.gz')
+
+    def writeAtomically(self, path: str, data: bytes):
+        with open(path + '.tmp', 'wb') as file:
+            file.write(gzip.compress(data, compresslevel = 6))
+        os.replace(path + '.tmp', path)
+
+    def saveSnapshot(self, groups: dict, date: str = None):
+        """Saves groups ({groupName: runs}) as the snapshot for date (YYYY-MM-DD, today by default)."""
+        date = date or datetime.now().strftime("%Y-%m-%d")
+        index = {}
+        newChunks = 0
+        for groupName, runs in groups.items():
+            data = encodeGroup(runs)
+            digest = hashlib.sha256(data).hexdigest()
+            index[groupName] = digest
+            path = self.chunkPath(digest)
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok = True)
+                self.writeAtomically(path, data)
+                newChunks += 1
+
+        snapshot = {'date': date, 'groups': index}
+        self.writeAtomically(os.path.join(self.snapshotDirectory, f'{date}.json.gz'), json.dumps(snapshot).encode('utf-8'))
+        self.loadSnapshot.cache_clear()
+        _log.info(f"Saved snapshot {date} with {len(index)} groups, {newChunks} of them changed")
+        return newChunks
+
+    def listSnapshots(self):
+        return sorted(fileName[:-len('.json.gz')] for fileName in os.listdir(self.snapshotDirectory) if fileName.endswith('.json.gz'))
+
+    def snapshotAt(self, date: str):
+        """The date of the latest snapshot taken on or before date, or None."""
+        snapshots = self.listSnapshots()
+        position = bisect.bisect_right(snapshots, date)
+        return snapshots[position - 1] if position > 0 else None
+
+    def loadSnapshot(self, date: str):
+        """The snapshot's group name -> digest index, read-only since it is shared through the cache."""
+        with gzip.open(os.path.join(self.snapshotDirectory, f'{date}.json.gz'), 'rb') as file:
+            return MappingProxyType(json.load(file)['groups'])
+
+    def readChunk(self, digest: str):
+        with gzip.open(self.chunkPath(digest), 'rb') as file:
+            return file.read()
+
+    def loadChunk(self, digest: str):
+        # Decoded on every call from the cached bytes, so callers can add places and values to the runs
+        return json.loads(self.readChunk(digest))
+
+    def loadGroup(self, groupName: str, date: str):
+        """The runs of a group as of date, or None if it didn't exist then."""
+        snapshotDate = self.snapshotAt(date)
+        if snapshotDate == None:
+            return None
+        digest = self.loadSnapshot(snapshotDate).get(groupName)
+        return self.loadChunk(digest) if digest != None else None
+
+    def groupHistory(self, groupName: str, start: str = '', end: str = '9999-99-99'):
+        """Yields (date, runs) for every snapshot between start and end that contains the group."""
+        for date in self.listSnapshots():
+            if start <= date <= end:
+                digest = self.loadSnapshot(date).get(groupName)
+                if digest != None:
+                    yield date, self.loadChunk(digest)
@@ -0,0 +1,49 @@
+import json
+import statistics
+import subprocess
+import sys
+from time import perf_counter
+
+# Modules timed in a fresh interpreter each, and the heavy dependencies that importing them must not load
+MODULES = ['speedstats', 'speedstats.processruns', 'speedstats.playerindex', 'speedstats.refresh',
+           'speedstats.scraperunsv2', 'speedruncompy', 'speedruncompy.data_structures', 'speedruncompy.endpoints']
+HEAVY_MODULES = ['mysql.connector', 'requests', 'speedruncompy.endpoints']
+
+PROBE = """
+import json, logging, sys
+from time import perf_counter
+start = perf_counter()
+import {module}
+seconds = perf_counter() - start
+print(json.dumps({{
+    'seconds': seconds,
+    'loaded': [name for name in {heavy!r} if name in sys.modules],
+    'handlers': len(logging.getLogger('SpeedStats-V2').handlers),
+}}))
+"""
+
+def measure(module: str, repeats: int):
+    samples = []
+    for _ in range(repeats):
+        start = perf_counter()
+        output = subprocess.run([sys.executable, '-c', PROBE.format(module = module, heavy = HEAVY_MODULES)],
+                                capture_output = True, text = True, check = True).stdout
+        total = perf_counter() - start
+        result = json.loads(output)
+        result['total'] = total
+        samples.append(result)
+    return {
+        'module': module,
+        'importMs': statistics.median(sample['seconds'] for sample in samples) * 1000,
+        'interpreterMs': statistics.median(sample['total'] for sample in samples) * 1000,
+        'loaded': samples[0]['loaded'],
+        'handlers': samples[0]['handlers'],
+    }
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'module':32} {'import ms':>10} {'process ms':>11}  heavy modules loaded")
+    for module in MODULES:
+        result = measure(module, repeats)
+        sideEffects = f", {result['handlers']} log handlers added" if result['handlers'] > 0 else ''
+        print(f"{result['module']:32} {result['importMs']:10.1f} {result['interpreterMs']:11.1f}  {', '.join(result['loaded']) or '-'}{sideEffects}")
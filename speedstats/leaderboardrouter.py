@@ -0,0 +1,78 @@
+import logging
+import random
+import threading
+
+_log = logging.getLogger('SpeedStats-V2')
+
+LEADERBOARD_TYPES = (1, 2) # 1 = GetGameLeaderboard, 2 = GetGameLeaderboard2
+MIN_SAMPLES = 20 # Pages each type must serve or fail before the router starts exploiting
+EXPLORATION_RATE = 0.1 # Share of categories routed at random to keep measuring both types
+SMOOTHING = 0.05 # Weight of the newest page in the moving averages
+ERROR_PENALTY = 10 # How many successful pages one error is worth
+
+class EndpointStats:
+    __slots__ = ('samples', 'errors', 'latency', 'bytes', 'pageSize', 'errorRate')
+
+    def __init__(self):
+        self.samples = 0
+        self.errors = 0
+        self.latency = 0.0
+        self.bytes = 0.0
+        self.pageSize = 0.0
+        self.errorRate = 0.0
+
+    def average(self, current: float, sample: float):
+        if self.samples + self.errors <= 1:
+            return sample
+        return current + SMOOTHING * (sample - current)
+
+    def cost(self):
+        """Expected seconds spent per run fetched, inflated by how often the type errors."""
+        perRun = self.latency / max(self.pageSize, 1.0)
+        return perRun * (1 + ERROR_PENALTY * self.errorRate)
+
+    def toDict(self):
+        return {
+            'samples': self.samples,
+            'errors': self.errors,
+            'latency': round(self.latency, 4),
+            'bytes': round(self.bytes),
+            'pageSize': round(self.pageSize, 1),
+            'errorRate': round(self.errorRate, 4),
+            'cost': self.cost()
+        }
+
+class LeaderboardRouter:
+    """Routes each category to the leaderboard endpoint type that is currently cheapest per run, with epsilon exploration."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {type: EndpointStats() for type in LEADERBOARD_TYPES}
+
+    def choose(self):
+        with self.lock:
+            # Errors count too, so a failing type leaves warm-up and its error rate prices it out in cost()
+            warmingUp = [type for type in LEADERBOARD_TYPES if self.stats[type].samples + self.stats[type].errors < MIN_SAMPLES]
+            if len(warmingUp) > 0:
+                return random.choice(warmingUp)
+            if random.random() < EXPLORATION_RATE:
+                return random.choice(LEADERBOARD_TYPES)
+            return min(LEADERBOARD_TYPES, key=lambda type: self.stats[type].cost())
+
+    def record(self, type: int, seconds: float, numBytes: int = 0, numRuns: int = 0, error: bool = False):
+        with self.lock:
+            stats = self.stats[type]
+            if error:
+                stats.errors += 1
+                stats.errorRate = stats.average(stats.errorRate, 1.0)
+                stats.latency = stats.average(stats.latency, seconds)
+                return
+            stats.samples += 1
+            stats.errorRate = stats.average(stats.errorRate, 0.0)
+            stats.latency = stats.average(stats.latency, seconds)
+            stats.bytes = stats.average(stats.bytes, numBytes)
+            stats.pageSize = stats.average(stats.pageSize, numRuns)
+
+    def logStats(self):
+        with self.lock:
+            for type in LEADERBOARD_TYPES:
+                _log.info(f"Leaderboard type {type} stats: {self.stats[type].toDict()}")
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+
+_log = logging.getLogger('SpeedStats-V2')
+
+MAX_AGE = 7 * 24 * 60 * 60 # Seconds before a cached game is revalidated with GetGameData
+AGE_JITTER = 0.25 # Spreads revalidations so cached games don't all expire on the same crawl
+V1_TIMERS = {'realtime': 0, 'realtime_noloads': 1, 'ingame': 2} # v1 default-time -> v2 defaultTimer
+
+def trimGameData(game: dict):
+    """Keeps only the parts of a GetGameData payload the crawler uses."""
+    subcategoryIds = set()
+    variables = []
+    for variable in game['variables']:
+        if variable['isSubcategory'] == True:
+            subcategoryIds.add(variable['id'])
+            variables.append({'id': variable['id'], 'name': variable['name'], 'isSubcategory': True})
+
+    return {
+        'game': {'name': game['game'].get('name'), 'defaultTimer': game['game']['defaultTimer']},
+        'levels': [{'id': level['id'], 'name': level['name']} for level in game['levels']],
+        'platforms': [{'id': platform['id'], 'name': platform['name']} for platform in game['platforms']],
+        'variables': variables,
+        'values': [{'id': value['id'], 'variableId': value['variableId'], 'name': value['name']}
+                   for value in game['values'] if value['variableId'] in subcategoryIds],
+        'categories': [{'id': category['id'], 'name': category['name'], 'timeDirection': category['timeDirection']}
+                       for category in game['categories']]
+    }
+
+def gameDataFromV1(game: dict, timeDirections: dict):
+    """Builds a GetGameData-shaped payload from a v1 game with embedded categories, levels, variables and platforms.
+
+    v1 has no category time direction, so they come from `timeDirections` (the cached ones). Returns None if the game's
+    categories differ from those, since GetGameData is then needed anyway.
+    """
+    categories = game['categories']['data']
+    defaultTimer = V1_TIMERS.get(game['ruleset'].get('default-time'))
+    if defaultTimer == None or {category['id'] for category in categories} != set(timeDirections):
+        return None
+
+    variables = game['variables']['data']
+    return {
+        'game': {'name': game['names']['international'], 'defaultTimer': defaultTimer},
+        'levels': [{'id': level['id'], 'name': level['name']} for level in game['levels']['data']],
+        'platforms': [{'id': platform['id'], 'name': platform['name']} for platform in game['platforms']['data']],
+        'variables': [{'id': variable['id'], 'name': variable['name'], 'isSubcategory': variable['is-subcategory']} for variable in variables],
+        'values': [{'id': valueId, 'variableId': variable['id'], 'name': value['label']}
+                   for variable in variables for valueId, value in variable['values']['values'].items()],
+        'categories': [{'id': category['id'], 'name': category['name'], 'timeDirection': timeDirections[category['id']]}
+                       for category in categories]
+    }
+
+class MetadataCache:
+    """SQLite store of per-game dimension metadata, so unchanged games don't need GetGameData every crawl."""
+    def __init__(self, path: str, maxAge: float = MAX_AGE):
+        self.path = path
+        self.maxAge = maxAge
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS games (
+                id TEXT PRIMARY KEY,
+                name TEXT,
+                version TEXT NOT NULL,
+                fetchedAt REAL NOT NULL,
+                stale INTEGER NOT NULL DEFAULT 0,
+                data BLOB NOT NULL
+            );
+            DROP TABLE IF EXISTS players; -- Older caches stored player names, which runs already carry
+            CREATE TABLE IF NOT EXISTS categoryPages (
+                id TEXT PRIMARY KEY,
+                pages INTEGER NOT NULL
+            );
+            """)
+        self.conn.commit()
+
+    def isFresh(self, gameId: str, fetchedAt: float, now: float):
+        # Deterministic per-game jitter in [1 - AGE_JITTER, 1]
+        jitter = 1 - AGE_JITTER * (int(hashlib.md5(gameId.encode()).hexdigest()[:4], 16) / 0xffff)
+        return now - fetchedAt < self.maxAge * jitter
+
+    def getGame(self, gameId: str, gameName: str = None):
+        """Returns the cached, trimmed GetGameData payload for a game, or None if it is missing or needs revalidating."""
+        with self.lock:
+            row = self.conn.execute("SELECT name, fetchedAt, stale, data FROM games WHERE id = ?", (gameId, )).fetchone()
+        if row is None:
+            return None
+
+        name, fetchedAt, stale, data = row
+        if stale or not self.isFresh(gameId, fetchedAt, time.time()):
+            return None
+        if gameName != None and name != None and name.strip() != gameName.strip(): # Renamed since it was cached
+            return None
+        return json.loads(zlib.decompress(data))
+
+    def storeGame(self, gameId: str, game: dict):
+        trimmed = trimGameData(game)
+        payload = json.dumps(trimmed, separators=(',', ':'), sort_keys=True).encode('utf-8')
+        version = hashlib.sha1(payload).hexdigest()
+        with self.lock:
+            row = self.conn.execute("SELECT version FROM games WHERE id = ?", (gameId, )).fetchone()
+            if row != None and row[0] == version:
+                self.conn.execute("UPDATE games SET fetchedAt = ?, stale = 0 WHERE id = ?", (time.time(), gameId))
+            else:
+                if row != None:
+                    _log.info(f"Metadata for game {gameId} changed (version {row[0]} -> {version})")
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO games (id, name, version, fetchedAt, stale, data) VALUES (?, ?, ?, ?, 0, ?)",
+                    (gameId, trimmed['game']['name'], version, time.time(), zlib.compress(payload)))
+            self.conn.commit()
+        return trimmed
+
+    def getTimeDirections(self, gameId: str):
+        """Category id -> time direction from the last stored data for a game, however old. Empty if it was never cached."""
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM games WHERE id = ?", (gameId, )).fetchone()
+        if row is None:
+            return {}
+        return {category['id']: category['timeDirection'] for category in json.loads(zlib.decompress(row[0]))['categories']}
+
+    def markStale(self, gameId: str):
+        with self.lock:
+            self.conn.execute("UPDATE games SET stale = 1 WHERE id = ?", (gameId, ))
+            self.conn.commit()
+
+    def getCategoryPages(self, categoryIds: list):
+        """Returns the leaderboard page counts seen for these categories on previous crawls."""
+        categoryPages = {}
+        with self.lock:
+            for categoryId in categoryIds:
+                row = self.conn.execute("SELECT pages FROM categoryPages WHERE id = ?", (categoryId, )).fetchone()
+                if row != None:
+                    categoryPages[categoryId] = row[0]
+        return categoryPages
+
+    def storeCategoryPages(self, categoryPages: dict):
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO categoryPages (id, pages) VALUES (?, ?)", categoryPages.items())
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,140 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from collections import defaultdict
+from datetime import date
+
+_log = logging.getLogger('SpeedStats-V2')
+
+MAGIC = b'SSPIDX01'
+HEADER = struct.Struct('<8sIIQQQQ') # magic, players, leaderboards, player table, leaderboard table, rows, strings
+PLAYER_ENTRY = struct.Struct('<QIIdQI') # name offset, name length, rank, points, first row, row count
+LEADERBOARD_ENTRY = struct.Struct('<QI') # name offset, name length
+ROW_ENTRY = struct.Struct('<IIdI') # leaderboard, place, value, date ordinal (0 if unknown)
+
+def playerPoints(values: list):
+    """Same weighting as the playerRanks query: each run decays by 0.99 per better run, but keeps at least a quarter."""
+    return sum(max(value * 0.99 ** position, value * 0.25) for position, value in enumerate(sorted(values, reverse = True)))
+
+class PlayerIndexBuilder:
+    """Collects credited rows as generateCSV writes them and saves them as a sorted, memory-mappable index."""
+    def __init__(self):
+        self.leaderboards = {} # name -> index
+        self.rows = defaultdict(list) # player -> [(leaderboard, place, value, date ordinal)]
+        self.dateOrdinals = {"\\N": 0}
+
+    def addRow(self, name: str, player: str, place: int, value: float, dateText: str):
+        leaderboard = self.leaderboards.get(name)
+        if leaderboard == None:
+            leaderboard = self.leaderboards[name] = len(self.leaderboards)
+        ordinal = self.dateOrdinals.get(dateText)
+        if ordinal == None:
+            ordinal = self.dateOrdinals[dateText] = date.fromisoformat(dateText).toordinal()
+        self.rows[player].append((leaderboard, place, value, ordinal))
+
+    def write(self, path: str):
+        points = {player: playerPoints([row[2] for row in rows]) for player, rows in self.rows.items()}
+        ranks = {player: rank for rank, player in enumerate(sorted(points, key=lambda player: (-points[player], player)), start = 1)}
+        encodedPlayers = sorted((player.encode('utf-8'), player) for player in self.rows)
+
+        strings = bytearray()
+        def addString(text: bytes):
+            offset = len(strings)
+            strings.extend(text)
+            return offset, len(text)
+
+        playerTable = bytearray()
+        rowTable = bytearray()
+        numRows = 0
+        for encodedName, player in encodedPlayers:
+            rows = sorted(self.rows[player], key=lambda row: -row[2])
+            nameOffset, nameLength = addString(encodedName)
+            playerTable += PLAYER_ENTRY.pack(nameOffset, nameLength, ranks[player], points[player], numRows, len(rows))
+            for row in rows:
+                rowTable += ROW_ENTRY.pack(*row)
+            numRows += len(rows)
+
+        leaderboardTable = bytearray()
+        for name in self.leaderboards: # Insertion order matches the indices
+            leaderboardTable += LEADERBOARD_ENTRY.pack(*addString(name.encode('utf-8')))
+
+        playerTableOffset = HEADER.size
+        leaderboardTableOffset = playerTableOffset + len(playerTable)
+        rowTableOffset = leaderboardTableOffset + len(leaderboardTable)
+        stringsOffset = rowTableOffset + len(rowTable)
+        with open(path + '.tmp', 'wb') as file: # Replaced atomically, so readers that mapped the old index keep a consistent file
+            file.write(HEADER.pack(MAGIC, len(encodedPlayers), len(self.leaderboards),
+                                   playerTableOffset, leaderboardTableOffset, rowTableOffset, stringsOffset))
+            file.write(playerTable)
+            file.write(leaderboardTable)
+            file.write(rowTable)
+            file.write(strings)
+        os.replace(path + '.tmp', path)
+        _log.info(f"Wrote player index for {len(encodedPlayers)} players and {numRows} rows to {path}")
+        return len(encodedPlayers)
+
+class PlayerIndex:
+    """Read-only view of an index written by PlayerIndexBuilder. Lookups binary search the mapped player table."""
+    def __init__(self, path: str):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        (magic, self.numPlayers, self.numLeaderboards, self.playerTableOffset, self.leaderboardTableOffset,
+         self.rowTableOffset, self.stringsOffset) = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a player index")
+
+    def string(self, offset: int, length: int):
+        start = self.stringsOffset + offset
+        return self.map[start : start + length]
+
+    def playerEntry(self, position: int):
+        return PLAYER_ENTRY.unpack_from(self.map, self.playerTableOffset + position * PLAYER_ENTRY.size)
+
+    def find(self, player: str):
+        key = player.encode('utf-8')
+        low, high = 0, self.numPlayers
+        while low < high:
+            middle = (low + high) // 2
+            entry = self.playerEntry(middle)
+            name = self.string(entry[0], entry[1])
+            if name < key:
+                low = middle + 1
+            elif name > key:
+                high = middle
+            else:
+                return entry
+        return None
+
+    def lookup(self, player: str):
+        """Returns the player's rank, points and credited rows (best first), or None if they have none."""
+        entry = self.find(player)
+        if entry == None:
+            return None
+        _, _, rank, points, firstRow, rowCount = entry
+        runs = []
+        for position in range(firstRow, firstRow + rowCount):
+            leaderboard, place, value, ordinal = ROW_ENTRY.unpack_from(self.map, self.rowTableOffset + position * ROW_ENTRY.size)
+            nameOffset, nameLength = LEADERBOARD_ENTRY.unpack_from(self.map, self.leaderboardTableOffset + leaderboard * LEADERBOARD_ENTRY.size)
+            runs.append({
+                'leaderboard': self.string(nameOffset, nameLength).decode('utf-8'),
+                'place': place,
+                'value': value,
+                'date': date.fromordinal(ordinal).isoformat() if ordinal > 0 else None
+            })
+        return {'player': player, 'rank': rank, 'points': points, 'runs': runs}
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print("Usage: python -m speedstats.playerindex <index path> <player> [<player> ...]")
+        sys.exit(1)
+    index = PlayerIndex(sys.argv[1])
+    for player in sys.argv[2:]:
+        print(json.dumps(index.lookup(player), ensure_ascii = False, indent = 4))
+    index.close()
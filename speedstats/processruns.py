@@ -0,0 +1,337 @@
+import json
+from collections import defaultdict
+import math
+import sys
+import logging
+import os
+import sys
+import cProfile
+from time import perf_counter
+from .runreport import RunReport
+from .runshards import isShardDirectory, datasetDirectory, iterShards, readWRCounts
+from .rollups import Rollups, ROLLUP_TABLES
+from .history import HistoryStore
+from .playerindex import PlayerIndexBuilder
+from .runscsv import RunsCSVWriter
+
+excludedPlayers = [] # Requested to be excluded
+
+RUNS_COLUMNS = ['Leaderboard', 'Series', 'Game', 'Player', 'Platform', 'Place', 'Value', 'Date']
+
+_log = logging.getLogger('SpeedStats-V2')
+
+def groupRuns(runs: list):
+    groups = {}
+    for run in runs:
+        if run.get('groupName') not in groups:
+            groups[run.get('groupName')] = [run]
+        else:
+            groups[run.get('groupName')].append(run)
+    return groups
+
+def collectGroups(path: str, test: bool, workers: int = None):
+    # path is a shard directory or runs.json. A crawl's shards next to runs.json take precedence
+    directory = datasetDirectory(path)
+    if isShardDirectory(directory):
+        runs = [run for shardRuns in iterShards(directory, workers) for run in shardRuns]
+    else:
+        with open(path, 'r') as file:
+            runs = json.load(file)
+    _log.info(len(runs))
+    if len(runs) < 3500000 and not test:
+        _log.error("There aren't enough runs!")
+        sys.exit(1)
+    return groupRuns(runs)
+
+def findNumWRs(runs: list):
+    reverseTime = runs[0]['isReverseTime']
+    dateSortedRuns = sorted(runs, key=lambda run: (run['date'], run['dateSubmitted']))
+    currentWR = -1
+    numWRs = 0
+    for run in dateSortedRuns:
+        if run['date'] <= 0 or run['time'] == None: # date or time is null
+            continue
+        
+        if currentWR == -1 or (reverseTime and run['time'] > currentWR) or (not reverseTime and run['time'] < currentWR):
+            currentWR = run['time']
+            numWRs += 1
+    return numWRs
+
+def buildLeaderboard(runs: list):  
+    dateSortedRuns = sorted(runs, key=lambda run: (run['date'], run['dateSubmitted']))
+    
+    reverseTime = runs[0]['isReverseTime']
+    fullySortedRuns = sorted(dateSortedRuns, reverse = reverseTime, key = lambda run: (run['time']))
+    
+    uniquePlayerNames = []
+    leaderboard = []
+    
+    for run in fullySortedRuns:
+        if run.get('playerNames') not in uniquePlayerNames:
+            uniquePlayerNames.append(run.get('playerNames'))
+            leaderboard.append(run)
+    
+    return leaderboard
+
+def processGroups(groups: dict, report: RunReport = None, wrCounts: dict = None):
+    # Without obsolete runs, WR counts come from wrCounts. Groups missing from it are counted from current runs and logged
+    leaderboards = []
+    fallbackGroups = []
+    for groupName, runs in groups.items():
+        groupStart = perf_counter()
+        leaderboard = buildLeaderboard(runs)
+        numWRs = wrCounts.get(groupName) if wrCounts != None else None
+        if numWRs == None:
+            if wrCounts != None:
+                fallbackGroups.append(groupName)
+                _log.debug(f"No record history WR count for {groupName}, counting its current runs")
+            numWRs = findNumWRs(runs)
+        leaderboardRuns = len(leaderboard)
+        totalRuns = len(runs)
+        WRValue = (math.log(totalRuns, 1.7) * numWRs + 120 * math.exp(-100 / totalRuns) + 0.04 * totalRuns) * (1 - (numWRs + 1) / (totalRuns + leaderboardRuns))
+        sf = (math.log(leaderboardRuns, 10) / leaderboardRuns) + 0.001 if leaderboardRuns > 2 else 0.2
+        previousRun = None
+        currPlace = leaderboardRuns
+
+        for run in reversed(leaderboard):
+            if previousRun != None and previousRun['time'] == run['time']:
+                run['place'] = previousRun['place']
+            else:
+                run['place'] = currPlace
+
+            top = sf * WRValue * (leaderboardRuns + 1 - run['place'])
+            bottom = run['place'] + (sf * leaderboardRuns - 1)
+            value = top / bottom
+
+            if run['isLevelRun']:
+                value *= 0.5
+
+            run['value'] = value
+            previousRun = run
+            currPlace -= 1
+        
+        leaderboards.append(leaderboard)
+        if report != None:
+            report.recordGroup(groupName, perf_counter() - groupStart, totalRuns)
+    if len(fallbackGroups) > 0:
+        _log.warning(f"{len(fallbackGroups)} of {len(groups)} groups have no record history WR count and were counted from"
+                     f" current runs only, which undercounts them: {', '.join(fallbackGroups[:10])}")
+    return leaderboards
+
+def escapeName(name: str):
+    return name.replace("\\","\\\\")
+
+def escapeSeries(series: str):
+    return series.replace("\\","\\\\").replace(",", ".") if series != None else "\\N"
+
+def escapePlatform(platform: str):
+    return platform if platform != None else "\\N"
+
+def generateCSV(leaderboards: dict, csvPath: str, rollups: Rollups = None, playerIndex: PlayerIndexBuilder = None):
+    excluded = set(excludedPlayers)
+    with open(csvPath, mode='w', encoding='utf-8', newline='\n') as file:
+        writer = RunsCSVWriter(file)
+        for leaderboard in leaderboards:
+
+            name = escapeName(leaderboard[0].get('groupName'))
+            series = escapeSeries(leaderboard[0].get('seriesName'))
+            game = escapeName(leaderboard[0].get('gameName'))
+            prefix = writer.rowPrefix(name, series, game)
+            creditedPlayers = set()
+            if rollups != None:
+                rollups.addLeaderboard(game, series)
+
+            for run in leaderboard:
+
+                platform = escapePlatform(run.get('platformName'))
+                date = writer.dateText(run.get('date'))
+                playerNames = run.get('playerNames')
+                place = run.get('place')
+                valueText = "{:.3f}".format(run.get('value') / len(playerNames))
+                value = float(valueText) # Rollups and the player index add up the same rounded value the CSV holds
+
+                for player in playerNames:
+                    isGuest = player == None or player.startswith("[Guest]")
+                    # Only credits players for their best run in co-op categories
+                    if player not in creditedPlayers and player not in excluded and not isGuest:
+                        creditedPlayers.add(player)
+                        writer.writeRow(prefix, player, platform, place, valueText, date)
+                        if rollups != None:
+                            rollups.addRow(name, series, game, player, platform, value)
+                        if playerIndex != None:
+                            playerIndex.addRow(name, player, place, value, date)
+        writer.flush()
+    return writer.rowsWritten
+
+def loadCSV(cursor, absPath: str, table: str, columns: list):
+    cursor.execute(
+        f"""
+        LOAD DATA INFILE '{absPath}'
+        INTO TABLE {table}
+        FIELDS TERMINATED BY ',' 
+        ENCLOSED BY '\"' 
+        ESCAPED BY '\"'
+        LINES TERMINATED BY '\n'
+        ({', '.join(columns)});
+        """)
+
+def exportRollups(cursor, rollupPaths: dict):
+    for table, absPath in rollupPaths.items():
+        _, columns, createStatement = ROLLUP_TABLES[table]
+        cursor.execute(createStatement)
+        cursor.execute(f"TRUNCATE TABLE {table}")
+        loadCSV(cursor, absPath, table, columns)
+
+def connectToDatabase():
+    import mysql.connector as mariadb # Only exports need the driver, so processing and test runs never load it
+    try:
+        return mariadb.connect(
+            host="localhost",
+            user="root",
+            password = "",
+            database="test"
+        )
+    except mariadb.Error as e:
+        _log.error(f"Error connecting to MariaDB Platform: {e}")
+        sys.exit(1)
+
+def exportToDatabase(absPath: str, rollupPaths: dict = {}):
+    conn = connectToDatabase()
+
+    try:
+        cursor = conn.cursor()
+        cursor.execute("TRUNCATE TABLE runs")
+        loadCSV(cursor, absPath, 'runs', RUNS_COLUMNS)
+
+        cursor.execute("TRUNCATE TABLE playerRanks")
+        cursor.execute(
+            f"""
+            INSERT INTO playerRanks (Rank, Player, Points)
+            SELECT ROW_NUMBER() OVER (ORDER BY Points DESC) AS Rank, t1.Player, t1.Points
+            FROM (
+                SELECT Player, SUM(GREATEST(Value * POWER(0.99, (PlayerRank - 1)), Value * 0.25)) AS Points
+                FROM (
+                    SELECT Player, Value, ROW_NUMBER() OVER (PARTITION BY Player ORDER BY Value DESC) AS PlayerRank
+                    FROM runs
+                ) AS rankedRuns
+                GROUP BY Player
+                ORDER BY Points DESC
+            ) AS t1;
+            """
+        )
+        exportRollups(cursor, rollupPaths)
+        conn.commit()
+    except Exception as e:
+        _log.error(e)
+
+def fillTemporaryTable(cursor, table: str, column: str, values: set):
+    cursor.execute(f"CREATE TEMPORARY TABLE {table} ({column} VARCHAR(255) PRIMARY KEY)")
+    cursor.executemany(f"INSERT IGNORE INTO {table} ({column}) VALUES (%s)", [(value, ) for value in values])
+
+def exportRefresh(absPath: str, gameNames: set, seriesNames: set, platformNames: set, rollupPaths: dict = {}):
+    # Replaces the given games' runs, then updates only their players' points, the ranks and the rollups touching them
+    conn = connectToDatabase()
+
+    try:
+        cursor = conn.cursor()
+        for _, _, createStatement in ROLLUP_TABLES.values(): # DDL commits implicitly, so it has to come before the first change
+            cursor.execute(createStatement)
+        fillTemporaryTable(cursor, 'refreshGames', 'Game', gameNames)
+        fillTemporaryTable(cursor, 'refreshSeries', 'Series', seriesNames)
+        fillTemporaryTable(cursor, 'refreshPlatforms', 'Platform', platformNames)
+        fillTemporaryTable(cursor, 'refreshPlayers', 'Player', set())
+
+        cursor.execute("INSERT IGNORE INTO refreshPlayers SELECT DISTINCT Player FROM runs WHERE Game IN (SELECT Game FROM refreshGames)")
+        cursor.execute("DELETE FROM runs WHERE Game IN (SELECT Game FROM refreshGames)")
+        loadCSV(cursor, absPath, 'runs', RUNS_COLUMNS)
+        cursor.execute("INSERT IGNORE INTO refreshPlayers SELECT DISTINCT Player FROM runs WHERE Game IN (SELECT Game FROM refreshGames)")
+
+        cursor.execute("DELETE FROM playerRanks WHERE Player IN (SELECT Player FROM refreshPlayers)")
+        cursor.execute(
+            f"""
+            INSERT INTO playerRanks (Rank, Player, Points)
+            SELECT 0, Player, SUM(GREATEST(Value * POWER(0.99, (PlayerRank - 1)), Value * 0.25)) AS Points
+            FROM (
+                SELECT Player, Value, ROW_NUMBER() OVER (PARTITION BY Player ORDER BY Value DESC) AS PlayerRank
+                FROM runs
+                WHERE Player IN (SELECT Player FROM refreshPlayers)
+            ) AS rankedRuns
+            GROUP BY Player;
+            """
+        )
+        cursor.execute(
+            f"""
+            UPDATE playerRanks
+            JOIN (
+                SELECT Player, ROW_NUMBER() OVER (ORDER BY Points DESC) AS NewRank
+                FROM playerRanks
+            ) AS t1 USING (Player)
+            SET playerRanks.Rank = t1.NewRank
+            WHERE playerRanks.Rank <> t1.NewRank;
+            """
+        )
+
+        if 'gameStats' in rollupPaths:
+            cursor.execute("DELETE FROM gameStats WHERE Game IN (SELECT Game FROM refreshGames)")
+            loadCSV(cursor, rollupPaths['gameStats'], 'gameStats', ROLLUP_TABLES['gameStats'][1])
+        cursor.execute("DELETE FROM seriesPlayerStats WHERE Series IN (SELECT Series FROM refreshSeries)")
+        cursor.execute(
+            f"""
+            INSERT INTO seriesPlayerStats (Series, Player, SeriesRank, Runs, Points)
+            SELECT Series, Player, ROW_NUMBER() OVER (PARTITION BY Series ORDER BY SUM(Value) DESC, Player), COUNT(*), SUM(Value)
+            FROM runs
+            WHERE Series IN (SELECT Series FROM refreshSeries)
+            GROUP BY Series, Player;
+            """
+        )
+        cursor.execute("DELETE FROM platformStats WHERE Platform IN (SELECT Platform FROM refreshPlatforms)")
+        cursor.execute(
+            f"""
+            INSERT INTO platformStats (Platform, Leaderboards, Runs, Players, Points)
+            SELECT Platform, COUNT(DISTINCT Leaderboard), COUNT(*), COUNT(DISTINCT Player), SUM(Value)
+            FROM runs
+            WHERE Platform IN (SELECT Platform FROM refreshPlatforms)
+            GROUP BY Platform;
+            """
+        )
+        conn.commit()
+    except Exception as e:
+        _log.error(e)
+
+def processRuns(jsonPath: str, csvPath: str, test: bool, profile: bool = False, traceMemory: bool = False, historyPath: str = None,
+                workers: int = None):
+    basePath = os.path.splitext(csvPath)[0]
+    report = RunReport(traceMemory = traceMemory)
+    profiler = cProfile.Profile() if profile else None
+    if profiler != None:
+        profiler.enable()
+
+    with report.stage('collectGroups') as stage:
+        groups = collectGroups(jsonPath, test, workers)
+        stage['items']['groups'] = len(groups)
+        stage['items']['runs'] = sum(len(runs) for runs in groups.values())
+    if historyPath != None:
+        with report.stage('saveSnapshot') as stage: # Before processGroups adds places and values to the runs
+            stage['items']['newChunks'] = HistoryStore(historyPath).saveSnapshot(groups)
+    with report.stage('processGroups') as stage:
+        leaderboards = processGroups(groups, report, readWRCounts(jsonPath))
+        stage['items']['leaderboardRuns'] = sum(len(leaderboard) for leaderboard in leaderboards)
+    rollups = Rollups()
+    playerIndex = PlayerIndexBuilder()
+    with report.stage('generateCSV') as stage:
+        stage['items']['rows'] = generateCSV(leaderboards, csvPath, rollups, playerIndex)
+    with report.stage('writeRollups') as stage:
+        rollupPaths = rollups.writeCSVs(basePath)
+        stage['items']['games'] = len(rollups.games)
+    with report.stage('writePlayerIndex') as stage:
+        stage['items']['players'] = playerIndex.write(f'{basePath}-players.idx')
+    if not test:
+        with report.stage('exportToDatabase'):
+            absPath = os.path.join(os.getcwd(), csvPath)
+            exportToDatabase(absPath, {table: os.path.join(os.getcwd(), path) for table, path in rollupPaths.items()})
+
+    if profiler != None:
+        profiler.disable()
+        profiler.dump_stats(f'{basePath}.prof')
+        _log.info(f"Wrote cProfile stats to {basePath}.prof")
+    report.write(f'{basePath}.report.json')
@@ -0,0 +1,80 @@
+import logging
+import os
+from . import scraperunsv2 as scraper
+from . import processruns
+from .rollups import Rollups
+from .runshards import RUN_COLUMNS, ShardWriter, datasetDirectory, isShardDirectory, mergeShards, readManifest
+
+_log = logging.getLogger('SpeedStats-V2')
+
+def readDatasetManifest(path: str):
+    directory = datasetDirectory(path)
+    if not isShardDirectory(directory): # Games are replaced shard by shard, so a merged runs.json alone can't be refreshed
+        raise ValueError(f"{path} has no shard directory at {directory}, refresh only works on crawls that kept their shards")
+    return readManifest(directory)
+
+def crawlGames(gameOverviews: list, obsolete: bool = True):
+    """Re-crawls the given games from scratch and returns their runs as shard rows, with record history WR counts
+    when obsolete runs are skipped."""
+    scraper.openMetadataCache()
+    for gameOverview in gameOverviews:
+        scraper.metadataCache.markStale(gameOverview['id']) # Levels and categories may have changed too
+    scraper.groups.clear() # Group names are cached per process and may have been renamed
+    categoryQueue = scraper.exploreList(gameOverviews, scraper.games, scraper.exploreGame)
+    scraper.exploreCategories(categoryQueue, obsolete = obsolete)
+    rows = [run.toRow() for run in scraper.runs]
+    scraper.runs.clear()
+    return rows, scraper.countRecordWRs()
+
+def refreshGameOverviews(path: str, gameOverviews: list, csvPath: str, test: bool):
+    directory = datasetDirectory(path)
+    obsolete = readDatasetManifest(path).get('obsolete', True) # Refreshed games follow the stored crawl's mode, so totals stay comparable
+    shardWriter = ShardWriter(directory, resume = True, obsolete = obsolete)
+    scraper.series.update(shardWriter.manifest['series'])
+
+    rows, wrCounts = crawlGames(gameOverviews, obsolete)
+    removedRuns = shardWriter.replaceGames(rows, gameOverviews, dict(scraper.series), wrCounts)
+    refreshedRuns = [dict(zip(RUN_COLUMNS, row)) for row in rows]
+    _log.info(f"Replaced {len(removedRuns)} stored runs with {len(refreshedRuns)} refreshed runs for {len(gameOverviews)} games")
+    if os.path.isfile(path): # Keep a merged runs.json in step with its shards
+        mergeShards(shardWriter.directory, path)
+
+    leaderboards = processruns.processGroups(processruns.groupRuns(refreshedRuns), wrCounts = wrCounts if not obsolete else None)
+    rollups = Rollups()
+    processruns.generateCSV(leaderboards, csvPath, rollups)
+    rollupPaths = rollups.writeCSVs(os.path.splitext(csvPath)[0])
+
+    affectedRuns = removedRuns + refreshedRuns
+    gameNames = {processruns.escapeName(run['gameName']) for run in affectedRuns}
+    seriesNames = {processruns.escapeSeries(run['seriesName']) for run in affectedRuns if run['seriesName'] != None}
+    platformNames = {processruns.escapePlatform(run['platformName']) for run in affectedRuns}
+    if not test:
+        processruns.exportRefresh(os.path.join(os.getcwd(), csvPath), gameNames, seriesNames, platformNames,
+                                  {'gameStats': os.path.join(os.getcwd(), rollupPaths['gameStats'])})
+    return len(refreshedRuns)
+
+def refreshGames(path: str, gameIds: list, csvPath: str = 'data/refresh.csv', test: bool = False):
+    """Re-crawls specific games into the stored dataset at `path` (a shard directory, or the runs.json next to one) and
+    updates only their rows, their players' ranks and their rollups in the database."""
+    gameOverviews = []
+    storedOverviews = readDatasetManifest(path)['gameOverviews']
+    for gameId in gameIds:
+        gameOverview = storedOverviews.get(gameId)
+        if gameOverview == None:
+            _log.warning(f"Game {gameId} is not in the stored dataset, adding it without a series.")
+            gameOverview = {'name': scraper.GetGameData(gameId).perform()['game']['name'], 'seriesId': None}
+        gameOverviews.append({'seriesId': gameOverview['seriesId'], 'id': gameId, 'name': gameOverview['name']})
+    return refreshGameOverviews(path, gameOverviews, csvPath, test)
+
+def refreshSeries(path: str, seriesIds: list, csvPath: str = 'data/refresh.csv', test: bool = False):
+    """Same as refreshGames for every game currently listed in the given series."""
+    storedSeries = readDatasetManifest(path)['series']
+    if any(seriesId not in storedSeries for seriesId in seriesIds):
+        storedSeries.update({seriesOverview['id']: seriesOverview['name'].strip()
+                             for seriesOverview in scraper.explorePages('series', scraper.GetSeriesList, 'seriesList')})
+
+    gameOverviews = []
+    for seriesId in seriesIds:
+        scraper.series[seriesId] = storedSeries[seriesId]
+        gameOverviews.extend(scraper.exploreSeries({'id': seriesId}))
+    return refreshGameOverviews(path, gameOverviews, csvPath, test)
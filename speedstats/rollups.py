@@ -0,0 +1,104 @@
+import csv
+import logging
+from collections import defaultdict
+
+_log = logging.getLogger('SpeedStats-V2')
+
+# Table name -> (CSV suffix, columns, CREATE TABLE statement)
+ROLLUP_TABLES = {
+    'gameStats': ('games', ['Game', 'Series', 'Leaderboards', 'Runs', 'Players', 'Points'],
+        """
+        CREATE TABLE IF NOT EXISTS gameStats (
+            Game VARCHAR(255) NOT NULL,
+            Series VARCHAR(255),
+            Leaderboards INT NOT NULL,
+            Runs INT NOT NULL,
+            Players INT NOT NULL,
+            Points DOUBLE NOT NULL,
+            PRIMARY KEY (Game),
+            INDEX (Series)
+        )
+        """),
+    'seriesPlayerStats': ('series', ['Series', 'Player', 'SeriesRank', 'Runs', 'Points'],
+        """
+        CREATE TABLE IF NOT EXISTS seriesPlayerStats (
+            Series VARCHAR(255) NOT NULL,
+            Player VARCHAR(255) NOT NULL,
+            SeriesRank INT NOT NULL,
+            Runs INT NOT NULL,
+            Points DOUBLE NOT NULL,
+            PRIMARY KEY (Series, SeriesRank),
+            INDEX (Player)
+        )
+        """),
+    'platformStats': ('platforms', ['Platform', 'Leaderboards', 'Runs', 'Players', 'Points'],
+        """
+        CREATE TABLE IF NOT EXISTS platformStats (
+            Platform VARCHAR(255) NOT NULL,
+            Leaderboards INT NOT NULL,
+            Runs INT NOT NULL,
+            Players INT NOT NULL,
+            Points DOUBLE NOT NULL,
+            PRIMARY KEY (Platform)
+        )
+        """)
+}
+
+class Rollups:
+    """Per-game, per-series and per-platform aggregates of the rows generateCSV emits, keyed on the same
+    escaped Game, Series and Platform strings so they line up with the runs table."""
+    def __init__(self):
+        self.games = {} # game -> [series, leaderboards, runs, players, points]
+        self.gamePlayers = defaultdict(set)
+        self.seriesPlayers = defaultdict(lambda: [0, 0.0]) # (series, player) -> [runs, points]
+        self.platforms = defaultdict(lambda: [set(), 0, set(), 0.0]) # platform -> [leaderboards, runs, players, points]
+
+    def addLeaderboard(self, game: str, series: str):
+        if game not in self.games:
+            self.games[game] = [series, 0, 0, 0, 0.0]
+        self.games[game][1] += 1
+
+    def addRow(self, name: str, series: str, game: str, player: str, platform: str, value: float):
+        gameStats = self.games[game]
+        gameStats[2] += 1
+        gameStats[4] += value
+        self.gamePlayers[game].add(player)
+
+        if series != "\\N":
+            seriesStats = self.seriesPlayers[(series, player)]
+            seriesStats[0] += 1
+            seriesStats[1] += value
+
+        platformStats = self.platforms[platform]
+        platformStats[0].add(name)
+        platformStats[1] += 1
+        platformStats[2].add(player)
+        platformStats[3] += value
+
+    def rows(self, table: str):
+        if table == 'gameStats':
+            for game, (series, leaderboards, runs, _, points) in self.games.items():
+                yield [game, series, leaderboards, runs, len(self.gamePlayers[game]), "{:.3f}".format(points)]
+        elif table == 'seriesPlayerStats':
+            bySeries = defaultdict(list)
+            for (series, player), (runs, points) in self.seriesPlayers.items():
+                bySeries[series].append((points, player, runs))
+            for series, seriesPlayers in bySeries.items():
+                seriesPlayers.sort(key=lambda entry: (-entry[0], entry[1]))
+                for rank, (points, player, runs) in enumerate(seriesPlayers, start = 1):
+                    yield [series, player, rank, runs, "{:.3f}".format(points)]
+        elif table == 'platformStats':
+            for platform, (leaderboards, runs, players, points) in self.platforms.items():
+                yield [platform, len(leaderboards), runs, len(players), "{:.3f}".format(points)]
+
+    def writeCSVs(self, basePath: str):
+        """Writes one CSV per rollup table and returns {table: path}."""
+        paths = {}
+        for table, (suffix, _, _) in ROLLUP_TABLES.items():
+            path = f'{basePath}-{suffix}.csv'
+            with open(path, mode='w', encoding='utf-8', newline='\n') as file:
+                writer = csv.writer(file, quoting=csv.QUOTE_ALL, lineterminator='\n')
+                writer.writerows(self.rows(table))
+            paths[table] = path
+        _log.info(f"Wrote rollups for {len(self.games)} games, {len(self.seriesPlayers)} series players and {len(self.platforms)} platforms")
+        return paths
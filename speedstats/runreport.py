@@ -0,0 +1,75 @@
+import heapq
+import json
+import logging
+import sys
+import tracemalloc
+from contextlib import contextmanager
+from time import perf_counter, process_time
+
+try:
+    import resource
+except ImportError: # Not available on Windows
+    resource = None
+
+_log = logging.getLogger('SpeedStats-V2')
+
+def getPeakRSS():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024 # Linux reports KiB, macOS reports bytes
+
+class RunReport:
+    """Collects per-stage timings, memory peaks and item counts for a processRuns invocation."""
+    def __init__(self, traceMemory: bool = False, topGroups: int = 20):
+        self.traceMemory = traceMemory
+        self.topGroups = topGroups
+        self.stages = []
+        self.slowestGroups = [] # Min-heap of (seconds, groupName, totalRuns)
+        if traceMemory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name: str):
+        record = {'name': name, 'items': {}}
+        if self.traceMemory:
+            tracemalloc.reset_peak()
+        wallStart = perf_counter()
+        cpuStart = process_time()
+        try:
+            yield record
+        finally:
+            record['wallSeconds'] = round(perf_counter() - wallStart, 3)
+            record['cpuSeconds'] = round(process_time() - cpuStart, 3)
+            record['peakRSSBytes'] = getPeakRSS()
+            if self.traceMemory:
+                record['tracemallocPeakBytes'] = tracemalloc.get_traced_memory()[1]
+            self.stages.append(record)
+            _log.info(f"Stage {name} took {record['wallSeconds']}s wall, {record['cpuSeconds']}s CPU {record['items']}")
+
+    def recordGroup(self, groupName: str, seconds: float, totalRuns: int):
+        if self.topGroups <= 0:
+            return
+        entry = (seconds, groupName, totalRuns)
+        if len(self.slowestGroups) < self.topGroups:
+            heapq.heappush(self.slowestGroups, entry)
+        elif entry > self.slowestGroups[0]:
+            heapq.heapreplace(self.slowestGroups, entry)
+
+    def toDict(self):
+        return {
+            'stages': self.stages,
+            'slowestGroups': [
+                {'groupName': groupName, 'seconds': round(seconds, 6), 'totalRuns': totalRuns}
+                for seconds, groupName, totalRuns in sorted(self.slowestGroups, reverse = True)
+            ],
+            'totalWallSeconds': round(sum(stage['wallSeconds'] for stage in self.stages), 3),
+            'totalCpuSeconds': round(sum(stage['cpuSeconds'] for stage in self.stages), 3)
+        }
+
+    def write(self, path: str):
+        if self.traceMemory:
+            tracemalloc.stop()
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.toDict(), file, indent = 4)
+        _log.info(f"Wrote run report to {path}")
@@ -0,0 +1,43 @@
+from datetime import datetime
+
+CHUNK_ROWS = 50000 # Rows joined into one string per file write
+
+def quote(field: str):
+    """Quotes a field the way csv.writer does with QUOTE_ALL: always enclosed, embedded quotes doubled."""
+    return '"' + field.replace('"', '""') + '"'
+
+class RunsCSVWriter:
+    """Writes runs table rows byte for byte like csv.writer(quoting=csv.QUOTE_ALL, lineterminator='\\n') would, without
+    its per-row overhead: the leaderboard, series and game columns are quoted once per leaderboard, platforms and dates
+    are quoted once per distinct value, and rows are collected into chunks written with a single call."""
+    def __init__(self, file, chunkRows: int = CHUNK_ROWS):
+        self.file = file
+        self.chunkRows = chunkRows
+        self.lines = []
+        self.rowsWritten = 0
+        self.dates = {} # timestamp -> date text. Run dates are whole days, so this holds one entry per day
+        self.platforms = {} # escaped platform -> quoted platform
+
+    def dateText(self, timestamp: int):
+        text = self.dates.get(timestamp)
+        if text == None:
+            text = self.dates[timestamp] = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d") if timestamp > 0 else "\\N"
+        return text
+
+    def rowPrefix(self, name: str, series: str, game: str):
+        """The quoted leaderboard, series and game columns shared by every row of a leaderboard."""
+        return f'{quote(name)},{quote(series)},{quote(game)},'
+
+    def writeRow(self, prefix: str, player: str, platform: str, place: int, valueText: str, dateText: str):
+        quotedPlatform = self.platforms.get(platform)
+        if quotedPlatform == None:
+            quotedPlatform = self.platforms[platform] = quote(platform)
+        self.lines.append(f'{prefix}{quote(player)},{quotedPlatform},"{place}","{valueText}","{dateText}"\n')
+        if len(self.lines) >= self.chunkRows:
+            self.flush()
+
+    def flush(self):
+        if len(self.lines) > 0:
+            self.file.write(''.join(self.lines))
+            self.rowsWritten += len(self.lines)
+            self.lines = []
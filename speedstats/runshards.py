@@ -0,0 +1,160 @@
+import gzip
+import json
+import logging
+import lzma
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+_log = logging.getLogger('SpeedStats-V2')
+
+MANIFEST_NAME = 'manifest.json'
+# Shards store runs positionally in this order, matching the keys of Run.toDict
+RUN_COLUMNS = ['groupName', 'seriesName', 'gameName', 'time', 'date', 'dateSubmitted', 'isLevelRun',
+               'isReverseTime', 'deafultTimer', 'platformName', 'playerNames', 'gameId']
+# Codec -> (shard file extension, compress, decompress). Readers pick the codec from the extension, so a
+# directory can mix them
+CODECS = {
+    'none': ('.json', bytes, bytes),
+    'gzip': ('.json.gz', lambda data: gzip.compress(data, compresslevel = 6), gzip.decompress),
+    'lzma': ('.json.xz', lzma.compress, lzma.decompress),
+}
+DEFAULT_CODEC = 'gzip'
+
+def shardDirectory(path: str):
+    return os.path.splitext(path)[0] + '.shards'
+
+def isShardDirectory(path: str):
+    return os.path.isfile(os.path.join(path, MANIFEST_NAME))
+
+def datasetDirectory(path: str):
+    """The shard directory for `path`, which is either the directory itself or the runs.json next to it."""
+    return path if isShardDirectory(path) else shardDirectory(path)
+
+def codecFor(fileName: str):
+    for codec, (extension, _, _) in CODECS.items():
+        if fileName.endswith(extension):
+            return codec
+    raise ValueError(f"{fileName} has no known shard codec")
+
+def readManifest(directory: str):
+    with open(os.path.join(directory, MANIFEST_NAME), 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+class ShardWriter:
+    """Writes crawled runs to numbered, compressed shard files in a directory, tracked by a manifest that is updated
+    atomically. New shards use `codec`; shards already in a resumed directory keep theirs. The manifest records whether
+    the crawl includes obsolete runs, and a resumed directory keeps its mode."""
+    def __init__(self, directory: str, resume: bool = False, codec: str = DEFAULT_CODEC, obsolete: bool = True):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown shard codec {codec}, expected one of {', '.join(CODECS)}")
+        self.directory = directory
+        self.codec = codec
+        os.makedirs(directory, exist_ok = True)
+        if resume and isShardDirectory(directory):
+            self.manifest = readManifest(directory)
+            if self.obsolete != obsolete:
+                raise ValueError(f"{directory} was crawled {'with' if self.obsolete else 'without'} obsolete runs and can't be resumed in the other mode")
+            _log.info(f"Resuming from {len(self.manifest['shards'])} shards in {directory}")
+        else:
+            self.manifest = {'columns': RUN_COLUMNS, 'shards': [], 'gameOverviews': {}, 'series': {}, 'obsolete': obsolete, 'wrCounts': {}}
+            self.writeManifest()
+
+    @property
+    def obsolete(self):
+        return self.manifest.get('obsolete', True)
+
+    def completedGames(self):
+        return {gameId for shard in self.manifest['shards'] for gameId in shard['games']}
+
+    def write(self, rows: list, gameOverviews: list, seriesNames: dict = {}, wrCounts: dict = {}):
+        fileName = f"shard-{len(self.manifest['shards']) + 1:05d}{CODECS[self.codec][0]}"
+        self.writeShard(fileName, rows)
+        self.manifest['shards'].append({'file': fileName, 'runs': len(rows), 'games': [gameOverview['id'] for gameOverview in gameOverviews]})
+        self.recordOverviews(gameOverviews, seriesNames)
+        self.manifest.setdefault('wrCounts', {}).update(wrCounts)
+        self.writeManifest()
+        _log.info(f"Wrote {len(rows)} runs for {len(gameOverviews)} games to {fileName}")
+
+    def writeShard(self, fileName: str, rows: list):
+        shardPath = os.path.join(self.directory, fileName)
+        _, compress, _ = CODECS[codecFor(fileName)]
+        with open(shardPath + '.tmp', 'wb') as file:
+            file.write(compress(json.dumps(rows, separators=(',', ':')).encode('utf-8')))
+        os.replace(shardPath + '.tmp', shardPath)
+
+    def recordOverviews(self, gameOverviews: list, seriesNames: dict):
+        for gameOverview in gameOverviews:
+            self.manifest['gameOverviews'][gameOverview['id']] = {'name': gameOverview['name'], 'seriesId': gameOverview.get('seriesId')}
+        self.manifest['series'].update(seriesNames)
+
+    def replaceGames(self, rows: list, gameOverviews: list, seriesNames: dict = {}, wrCounts: dict = {}):
+        """Removes every stored run of the given games and writes `rows` as their new shard. Returns the removed runs."""
+        gameIds = {gameOverview['id'] for gameOverview in gameOverviews}
+        columns = self.manifest['columns']
+        removedRuns = []
+        for shard in self.manifest['shards']:
+            if gameIds.isdisjoint(shard['games']):
+                continue
+            keptRows = []
+            for run in readShard(self.directory, shard, columns):
+                if run.get('gameId') in gameIds:
+                    removedRuns.append(run)
+                else:
+                    keptRows.append([run.get(column) for column in columns])
+            self.writeShard(shard['file'], keptRows)
+            shard['runs'] = len(keptRows)
+            shard['games'] = [gameId for gameId in shard['games'] if gameId not in gameIds]
+        for run in removedRuns: # Their counts are recomputed from the new runs
+            self.manifest.get('wrCounts', {}).pop(run['groupName'], None)
+        self.write(rows, gameOverviews, seriesNames, wrCounts)
+        return removedRuns
+
+    def writeManifest(self):
+        manifestPath = os.path.join(self.directory, MANIFEST_NAME)
+        with open(manifestPath + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(self.manifest, file, indent = 4)
+        os.replace(manifestPath + '.tmp', manifestPath)
+
+def decodeShard(path: str, columns: list):
+    _, _, decompress = CODECS[codecFor(path)]
+    with open(path, 'rb') as file:
+        return [dict(zip(columns, row)) for row in json.loads(decompress(file.read()))]
+
+def readShard(directory: str, shard: dict, columns: list = RUN_COLUMNS):
+    return decodeShard(os.path.join(directory, shard['file']), columns)
+
+def readWRCounts(path: str):
+    """Precomputed WR counts by group name stored with the runs at `path`. None if the crawl included obsolete runs."""
+    directory = datasetDirectory(path)
+    if not isShardDirectory(directory):
+        return None
+    manifest = readManifest(directory)
+    return manifest.get('wrCounts', {}) if not manifest.get('obsolete', True) else None
+
+def iterShards(directory: str, workers: int = 1):
+    """Yields the runs of each shard as a list of run dicts, in manifest order. Groups never span shards since games
+    don't. With workers > 1 (None for one per core), shards are decompressed and decoded in that many processes."""
+    manifest = readManifest(directory)
+    paths = [os.path.join(directory, shard['file']) for shard in manifest['shards']]
+    columns = [manifest['columns']] * len(paths)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) < 2:
+        yield from map(decodeShard, paths, columns)
+        return
+    with ProcessPoolExecutor(max_workers = workers) as executor:
+        yield from executor.map(decodeShard, paths, columns)
+
+def mergeShards(directory: str, path: str):
+    """Streams every shard into a single runs.json-style file, one shard in memory at a time."""
+    numRuns = 0
+    with open(path, 'w') as file:
+        file.write('[')
+        for shardRuns in iterShards(directory):
+            for run in shardRuns:
+                if numRuns > 0:
+                    file.write(', ')
+                file.write(json.dumps(run))
+                numRuns += 1
+        file.write(']')
+    _log.info(f"Merged {numRuns} runs from {directory} into {path}")
+    return numRuns
@@ -0,0 +1,510 @@
+import os
+from threading import Thread
+import logging, json
+import random
+import math
+from time import perf_counter
+from queue import PriorityQueue
+from speedruncompy.ReturnThread import ReturnThread
+from speedruncompy.api import BaseRequest
+from speedruncompy.exceptions import APIException
+from speedruncompy.endpoints import (GetGameData, GetGameLeaderboard, GetGameLeaderboard2, GetGameList, GetGameRecordHistory, GetGames,
+                                     GetSeriesGames, GetSeriesList)
+from speedruncompy.data_structures import LeaderboardView, GameDataView
+from .metadatacache import MetadataCache, gameDataFromV1
+from .leaderboardrouter import LeaderboardRouter
+from .runshards import DEFAULT_CODEC, ShardWriter, shardDirectory, mergeShards
+from .workerstate import ShardedRegistry, WorkerBuffer, WorkerBuffers
+from .processruns import groupRuns, findNumWRs
+
+_log = logging.getLogger('SpeedStats-V2')
+
+CONCURRENT_THREADS = 2
+GAME_BATCH_SIZE = 90
+METADATA_CACHE_PATH = 'data/metadata.db'
+V1_PAGE_SIZE = 200 # Largest page v1 serves with embeds
+V1_EMBEDS = 'categories,levels,variables,platforms'
+FULL_REFRESH_RATE = 0.1 # Share of bulk-refreshable games revalidated with GetGameData anyway, to pick up time direction changes
+
+runs = []
+recordRuns = [] # Record history runs, only used for WR counts when obsolete runs aren't crawled
+
+series = ShardedRegistry()
+games = ShardedRegistry()
+categories = ShardedRegistry()
+subcategories = ShardedRegistry()
+subcategoryValues = ShardedRegistry()
+subcategoryVariables = ShardedRegistry() # Subcategory value id -> variable id, for record history filters
+levels = ShardedRegistry()
+groups = {}
+
+platforms = ShardedRegistry()
+
+workerBuffers = WorkerBuffers() # Worker threads accumulate runs and names here until the next stage boundary
+
+metadataCache = None
+staleGames = ShardedRegistry() # Games already marked stale this crawl
+leaderboardRouter = LeaderboardRouter()
+
+excludedGames = ['w6jrzxdj', 'o1y7pv1q'] # Speed Builders (API can't handle), White Tile 4 (Crashes website)
+excludedCategories = ['n2y350ed', '5dw43j0k'] # Subway Surfers - No Coins (API can't handle)
+
+LEADERBOARD_ENDPOINTS = {1: GetGameLeaderboard, 2: GetGameLeaderboard2}
+RECORD_HISTORY = 0 # Task type for a category's record history, alongside the leaderboard types
+
+class Run:
+    def __init__(self, seriesId: str, timeDirection: int, defaultTimer: int, run: dict, playerNames: dict):
+        isLevelRun = run.get('levelId') != None
+        levelId = run.get('levelId') if isLevelRun else ''
+        groupHash = run.get('categoryId') + levelId + ''.join(run.get('valueIds'))
+
+        if groupHash not in groups:
+            subcategoryValueNames = []
+            for valueId in run.get('valueIds'):
+                subcategoryValueName = subcategoryValues.get(valueId)
+                if subcategoryValueName != None:
+                    subcategoryValueNames.append(subcategoryValueName)
+
+            levelText = ', ' + levels.get(run.get('levelId')) if isLevelRun else ''
+            subcategoryText = ' - ' + ', '.join(subcategoryValueNames) if len(subcategoryValueNames) > 0 else ''
+            groupName = games.get(run.get('gameId')) + ": " + categories.get(run.get('categoryId')) + levelText + subcategoryText
+            groups[groupHash] = groupName
+        else:
+            groupName = groups.get(groupHash)
+
+        self.groupName = groupName
+        self.seriesName = series.get(seriesId)
+        self.gameName = games.get(run.get('gameId'))
+        self.gameId = run.get('gameId')
+        self.time = self.getTime(run, defaultTimer)
+        self.date = run.get('date') # can be 0 
+        self.dateSubmitted = run.get('dateSubmitted') if run.get('dateSubmitted') is not None else 2147483647
+        self.isLevelRun = isLevelRun
+        self.isReverseTime = True if timeDirection == 1 else False
+        self.defaultTimer = defaultTimer
+        self.platformName = platforms.get(run.get('platformId')) # can be None
+        self.playerNames = [playerNames.get(playerId) for playerId in run.get('playerIds')]
+
+    def getTime(self, run: dict, defaultTimer: int):
+        if defaultTimer == 0 or defaultTimer == 1: # If default timing is RTA or LRT, check 'time' before 'igt'
+            if run.get('time') != None:
+                return run.get('time')
+            elif run.get('timeWithLoads') != None:
+                return run.get('timeWithLoads')
+            elif run.get('igt') != None:
+                return run.get('igt') + 10000000.0 # Makes IGT slower, but handles categories w/o RTA correctly
+        elif run.get('igt') != None:
+            return run.get('igt')
+        elif run.get('time') != None: # Either RTA or LRT depending on game
+            return run.get('time')
+        elif run.get('timeWithLoads') != None: # RTA for games that use LRT
+            return run.get('timeWithLoads')
+        _log.warning(f"Run with id {run.get('id')} has a null time.")
+        return None
+        
+    def toDict(self):
+        return {
+            'groupName': self.groupName,
+            'seriesName': self.seriesName,
+            'gameName': self.gameName,
+            'time': self.time,
+            'date': self.date,
+            'dateSubmitted': self.dateSubmitted,
+            'isLevelRun': self.isLevelRun,
+            'isReverseTime': self.isReverseTime,
+            'deafultTimer': self.defaultTimer,
+            'platformName': self.platformName,
+            'playerNames': self.playerNames,
+            'gameId': self.gameId
+        }
+
+    def toRow(self):
+        # Same fields as toDict, in runshards.RUN_COLUMNS order
+        return [self.groupName, self.seriesName, self.gameName, self.time, self.date, self.dateSubmitted,
+                self.isLevelRun, self.isReverseTime, self.defaultTimer, self.platformName, self.playerNames, self.gameId]
+    
+def testEndpoint(request: BaseRequest):
+    #_log.info(type(request).__name__)
+    try:
+        response = request.perform()
+        _log.info(json.dumps(response))
+        return response
+    except APIException as e:
+        _log.error('API Error!', exc_info=e)
+        return e
+    
+def joinThreads(threads: list, extend: bool = True):
+    returnValues = []
+    for t in threads:
+        if (returnValue := t.join()) is not None: # Always None for normal Threads
+            returnValues.extend(returnValue) if extend else returnValues.append(returnValue)
+        else:
+            if type(t) == ReturnThread:
+                _log.warning("A Return Thread returned None.")
+    threads.clear()
+    return returnValues
+
+def getOverviews(elements: list):
+    overviews = []
+    for element in elements:
+        overview = {
+            'id': element['id'],
+            'name': element['name']
+        }
+        overviews.append(overview)
+    return overviews
+
+def explorePages(requestType: str, request: type, listKey: str, groupsOf: int = CONCURRENT_THREADS):
+    pageThreads = []
+    overviews = []
+    _log.info(f'Requesting {requestType} on page 1')
+    firstPage = request(page = 1).perform()
+    overviews.extend(getOverviews(firstPage[listKey]))
+    totalPages = firstPage['pagination']['pages']
+
+    for page in range(2, totalPages + 1):
+        t = ReturnThread(target=request(page = page).perform)
+        pageThreads.append(t)
+        _log.info(f'Requesting {requestType} on page {page}')
+        t.start()
+    
+        if page % groupsOf == 0:
+            for pageData in joinThreads(pageThreads, extend = False):
+                overviews.extend(getOverviews(pageData[listKey]))
+    
+    for pageData in joinThreads(pageThreads, extend = False):
+        overviews.extend(getOverviews(pageData[listKey]))
+    return overviews
+
+def exploreList(list: list, globalMap: dict, target: object, groupsOf: int = CONCURRENT_THREADS):
+    elementThreads = []
+    subElements = []
+    elementsExplored = 0
+    for element in list:
+        id = element['id']
+        if globalMap.claim(id, element['name'].strip()):
+            elementsExplored += 1
+            t = ReturnThread(target = target, args=(element, ))
+            elementThreads.append(t)
+            t.start()
+
+            if elementsExplored % groupsOf == 0:
+                subElements.extend(joinThreads(elementThreads))
+    
+    subElements.extend(joinThreads(elementThreads))
+    return subElements
+
+def mergeWorkerBuffers():
+    workerBuffers.drain(runs, recordRuns, levels, platforms, subcategories, subcategoryValues, subcategoryVariables)
+
+def playerNames(pagePlayers: list):
+    names = {}
+    for player in pagePlayers:
+        if len(player['id']) != 38: # Not a guest user
+            playerName = player['name'].strip()
+        else:
+            playerName = f"[Guest]{player['name'].strip()}"
+        names[player['id']] = playerName
+    return names
+
+def checkMetadata(gameId: str, run: dict):
+    # A run referencing a level or platform we don't know means the cached game data is out of date
+    if metadataCache == None:
+        return
+    levelId = run.get('levelId')
+    platformId = run.get('platformId')
+    if (levelId != None and levelId not in levels) or (platformId != None and platformId not in platforms):
+        if staleGames.claim(gameId, True): # Once per game, not once per run
+            _log.warning(f"Run with id {run.get('id')} references unknown metadata, marking game {gameId} as stale.")
+            metadataCache.markStale(gameId)
+
+def exploreLeaderboard(categoryOverview: dict, page: int = 1, type: int = 1, obsolete: bool = True, leaderboards: set = None):
+    seriesId = categoryOverview['seriesId']
+    gameId = categoryOverview['gameId']
+    categoryId = categoryOverview['id']
+    timeDirection = categoryOverview['timeDirection']
+    defaultTimer = categoryOverview['defaultTimer']
+    
+    _log.info(f"Getting run batch for game {games[gameId]} and category"
+            f" {categories[categoryId]} on page {page} with leaderboard type {type}")
+
+    request = LEADERBOARD_ENDPOINTS[type](gameId, categoryId, obsolete = 1 if obsolete else 0, video = 0, verified = 1, page = page)
+    start = perf_counter()
+    try:
+        runBatch = LeaderboardView.fromPayload(request.perform(), type)
+    except Exception:
+        leaderboardRouter.record(type, perf_counter() - start, error = True)
+        raise
+    leaderboardRouter.record(type, perf_counter() - start, len(request.response.content), len(runBatch.runs))
+
+    buffer = workerBuffers.get()
+    pagePlayers = playerNames(runBatch.players)
+
+    for run in runBatch.runs:
+        checkMetadata(gameId, run)
+        buffer.runs.append(Run(seriesId, timeDirection, defaultTimer, run, pagePlayers))
+        if leaderboards != None: # (level, subcategory values) of every leaderboard on the page, which is what names its group
+            leaderboards.add((run.get('levelId'), tuple(sorted(valueId for valueId in run.get('valueIds') if valueId in subcategoryValues))))
+
+    return runBatch.pages
+
+def exploreRecordHistory(categoryOverview: dict):
+    # Every page of one leaderboard's record history (the overview's levelId and valueIds), only used for WR counts
+    gameId = categoryOverview['gameId']
+    categoryId = categoryOverview['id']
+    levelId = categoryOverview['levelId']
+    valueIds = categoryOverview['valueIds']
+    _log.info(f"Getting record history for game {games[gameId]} and category {categories[categoryId]}"
+              f" with level {levelId} and values {valueIds}")
+
+    params = {'video': 0, 'verified': 1, 'values': [{'variableId': subcategoryVariables[valueId], 'valueIds': [valueId]} for valueId in valueIds]}
+    if levelId != None:
+        params['levelId'] = levelId
+    buffer = workerBuffers.get()
+    page = totalPages = 1
+    while page <= totalPages:
+        history = LeaderboardView.fromPayload(GetGameRecordHistory(gameId, categoryId, page = page, **params).perform(), 2)
+        historyPlayers = playerNames(history.players)
+        for run in history.runs:
+            buffer.recordRuns.append(Run(categoryOverview['seriesId'], categoryOverview['timeDirection'], categoryOverview['defaultTimer'], run, historyPlayers))
+        totalPages = history.pages
+        page += 1
+
+def exploreCategories(categoryOverviews: list, numWorkers: int = CONCURRENT_THREADS, obsolete: bool = True):
+    # All pages from one queue shared by the workers, categories with the most pages last crawl first
+    mergeWorkerBuffers() # Names found by exploreGame workers are needed to build runs
+    categoryIds = [categoryOverview['id'] for categoryOverview in categoryOverviews]
+    knownPages = metadataCache.getCategoryPages(categoryIds) if metadataCache != None else {}
+    crawledPages = {}
+    taskQueue = PriorityQueue() # Entries are (-pages, page, categoryId or history key, ...), unique before the overview is reached
+    historyKeys = ShardedRegistry() # Leaderboards whose record history is queued
+
+    for categoryOverview in categoryOverviews:
+        categoryId = categoryOverview['id']
+        if not categories.claim(categoryId, categoryOverview['name'].strip()):
+            continue
+        if categoryId in excludedCategories:
+            continue
+        taskQueue.put((-knownPages.get(categoryId, 1), 1, categoryId, categoryOverview, leaderboardRouter.choose()))
+
+    def worker():
+        while True:
+            _, page, _, categoryOverview, type = taskQueue.get()
+            if categoryOverview == None:
+                taskQueue.task_done()
+                return
+            try:
+                if type == RECORD_HISTORY:
+                    exploreRecordHistory(categoryOverview)
+                    continue
+                leaderboards = set() if not obsolete else None
+                totalPages = exploreLeaderboard(categoryOverview, page = page, type = type, obsolete = obsolete, leaderboards = leaderboards)
+                if page == 1:
+                    crawledPages[categoryOverview['id']] = totalPages
+                    for nextPage in range(2, totalPages + 1):
+                        taskQueue.put((-totalPages, nextPage, categoryOverview['id'], categoryOverview, type))
+                for levelId, valueIds in leaderboards or ():
+                    historyKey = f"{categoryOverview['id']}:{levelId or ''}:{','.join(valueIds)}"
+                    if historyKeys.claim(historyKey, True):
+                        taskQueue.put((-totalPages, 0, historyKey, dict(categoryOverview, levelId = levelId, valueIds = valueIds), RECORD_HISTORY))
+            except Exception as e:
+                if type == RECORD_HISTORY: # Its groups fall back to counting WRs from current runs in processGroups
+                    _log.error(f"Failed to get the record history of category {categoryOverview['id']} with level"
+                               f" {categoryOverview['levelId']} and values {categoryOverview['valueIds']}", exc_info=e)
+                else:
+                    _log.error(f"Failed to get page {page} of category {categoryOverview['id']}", exc_info=e)
+            finally:
+                taskQueue.task_done()
+
+    workers = [Thread(target = worker) for _ in range(numWorkers)]
+    for t in workers:
+        t.start()
+    taskQueue.join()
+    for i in range(len(workers)):
+        taskQueue.put((math.inf, 0, str(i), None, None))
+    joinThreads(workers)
+    mergeWorkerBuffers()
+
+    if metadataCache != None:
+        metadataCache.storeCategoryPages(crawledPages)
+
+def loadGameData(gameOverview: dict):
+    # GetGameData payload, trimmed when it comes from or goes through the metadata cache
+    gameId = gameOverview['id']
+    game = metadataCache.getGame(gameId, gameOverview['name']) if metadataCache != None else None
+    if game != None:
+        _log.info(f"Using cached data for game {gameOverview['name']}")
+        return game
+
+    _log.info(f"Requesting data for game {gameOverview['name']}")
+    game = GetGameData(gameId).perform()
+    if game != None and metadataCache != None:
+        game = metadataCache.storeGame(gameId, game)
+    return game
+
+def registerGame(gameOverview: dict, game: dict, buffer: WorkerBuffer):
+    # Adds the game's names to buffer and returns its category overviews
+    seriesId = gameOverview.get('seriesId')
+    gameId = gameOverview['id']
+    game = GameDataView.fromPayload(game)
+    
+    defaultTimer = game.defaultTimer
+
+    for level in game.levels:
+        buffer.levels[level.id] = level.name.strip()
+
+    for platform in game.platforms:
+        buffer.platforms[platform.id] = platform.name.strip()
+
+    for variable in game.subcategories:
+        buffer.subcategories[variable.id] = variable.name.strip()
+
+    for value in game.subcategoryValues:
+        buffer.subcategoryValues[value.id] = value.name.strip()
+        buffer.subcategoryVariables[value.id] = value.variableId
+        
+    categoryOverviews = []
+    for category in game.categories:
+        categoryOverview = {
+            'seriesId': seriesId,
+            'gameId': gameId,
+            'id': category.id,
+            'name': category.name,
+            'timeDirection': category.timeDirection,
+            'defaultTimer': defaultTimer
+        }
+        categoryOverviews.append(categoryOverview)
+    
+    return categoryOverviews
+
+def exploreGame(gameOverview: dict):
+    if gameOverview['id'] in excludedGames:
+        return None
+    game = loadGameData(gameOverview)
+    if game == None:
+        return None
+    return registerGame(gameOverview, game, workerBuffers.get())
+
+def prefetchGameData(groupsOf: int = CONCURRENT_THREADS):
+    # Revalidates expired cached games from bulk v1 pages, leaving incomplete ones to GetGameData
+    if metadataCache == None:
+        return
+    refreshed = incomplete = pages = 0
+    offset = 0
+    lastPage = False
+    while not lastPage:
+        pageThreads = []
+        for pageOffset in range(offset, offset + groupsOf * V1_PAGE_SIZE, V1_PAGE_SIZE):
+            t = ReturnThread(target=GetGames(max = V1_PAGE_SIZE, offset = pageOffset, embed = V1_EMBEDS).perform)
+            pageThreads.append(t)
+            _log.info(f'Requesting v1 games from offset {pageOffset}')
+            t.start()
+        offset += groupsOf * V1_PAGE_SIZE
+
+        pageResults = joinThreads(pageThreads, extend = False)
+        if len(pageResults) < groupsOf: # A page failed, the games after it are left to GetGameData
+            lastPage = True
+        for pageData in pageResults:
+            pages += 1
+            if pageData['pagination']['size'] < V1_PAGE_SIZE:
+                lastPage = True
+            for game in pageData['data']:
+                if metadataCache.getGame(game['id'], game['names']['international']) != None:
+                    continue
+                gameData = gameDataFromV1(game, metadataCache.getTimeDirections(game['id']))
+                if gameData == None:
+                    incomplete += 1
+                elif random.random() >= FULL_REFRESH_RATE:
+                    metadataCache.storeGame(game['id'], gameData)
+                    refreshed += 1
+    _log.info(f"Refreshed {refreshed} games from {pages} v1 pages, {incomplete} need GetGameData")
+
+def exploreSeries(seriesOverview: dict):
+    seriesId = seriesOverview['id']
+    _log.info(f"Requesting games for series {series[seriesId]}")
+    
+    if seriesId == "15ndxp7r": # Harry Potter
+        seriesGameList = GetSeriesGames(seriesId = seriesId, max = 200).perform()['data']
+    else:
+        seriesGameList = GetGameList(seriesId = seriesId).perform()['gameList']
+    
+    seriesGameOverviews = []
+    for game in seriesGameList:
+        gameOverview = {
+            'seriesId': seriesId,
+            'id': game['id'],
+            'name': game['names']['international'] if seriesId == "15ndxp7r" else game['name']
+        }
+        seriesGameOverviews.append(gameOverview)
+
+    return seriesGameOverviews
+
+def openMetadataCache(path: str = METADATA_CACHE_PATH):
+    global metadataCache
+    metadataCache = MetadataCache(path)
+    staleGames.clear()
+
+def dumpData(path: str):
+    runsDict = [run.toDict() for run in runs]
+    runsJson = json.dumps(runsDict)
+    with open(path, 'w') as file:
+        file.write(runsJson)
+
+def countWRs(recordRunList: list):
+    # WR counts per group from record history runs
+    return {groupName: findNumWRs(groupRecords) for groupName, groupRecords in groupRuns([run.toDict() for run in recordRunList]).items()}
+
+def countRecordWRs():
+    # WR counts from the record runs collected so far, which are then dropped
+    wrCounts = countWRs(recordRuns)
+    recordRuns.clear()
+    return wrCounts
+
+def spillRuns(shardWriter: ShardWriter, gameOverviews: list):
+    shardWriter.write([run.toRow() for run in runs], gameOverviews, series, countRecordWRs())
+    runs.clear()
+
+def testSeries(path: str, seriesId: str, seriesName: str):
+    openMetadataCache()
+    series[seriesId] = seriesName
+    gameQueue = exploreSeries({'id': seriesId})
+    categoryQueue = exploreList(gameQueue, games, exploreGame)
+    exploreCategories(categoryQueue)
+    dumpData(path)
+
+def testGame(path: str, gameId: str, gameName: str):
+    openMetadataCache()
+    gameQueue = [{'seriesId': None, 'id': gameId, 'name': gameName}]
+    categoryQueue = exploreList(gameQueue, games, exploreGame)
+    exploreCategories(categoryQueue)
+    dumpData(path)
+
+def exploreAll(path: str, resume: bool = False, merge: bool = False, codec: str = DEFAULT_CODEC, obsolete: bool = True,
+               bulkMetadata: bool = True):
+    # Spills each game batch to a shard next to path. Without obsolete, WR counts come from record histories
+    _log.info(f"Will output runs to path {path}")
+    openMetadataCache()
+    shardWriter = ShardWriter(shardDirectory(path), resume, codec, obsolete)
+    seriesQueue = explorePages('series', GetSeriesList, 'seriesList')
+    
+    gameQueue = exploreList(seriesQueue, series, exploreSeries) # Queues all series games
+    gameQueue.extend(explorePages('games', GetGameList, 'gameList')) # Queues all normal games, duplicates will be skipped later
+    if resume:
+        completedGames = shardWriter.completedGames()
+        gameQueue = [gameOverview for gameOverview in gameQueue if gameOverview['id'] not in completedGames]
+    if bulkMetadata:
+        prefetchGameData()
+
+    gameBatches = [gameQueue[x : x + GAME_BATCH_SIZE] for x in range(0, len(gameQueue), GAME_BATCH_SIZE)]
+    for gameBatch in gameBatches:
+        batchGameOverviews = {}
+        for gameOverview in gameBatch:
+            if gameOverview['id'] not in games:
+                batchGameOverviews.setdefault(gameOverview['id'], gameOverview)
+        categoryQueue = exploreList(gameBatch, games, exploreGame)
+        exploreCategories(categoryQueue, obsolete = obsolete) # Adds runs on every page, largest categories first
+        spillRuns(shardWriter, list(batchGameOverviews.values()))
+    
+    leaderboardRouter.logStats()
+    if merge:
+        mergeShards(shardWriter.directory, path)
@@ -0,0 +1,71 @@
+import threading
+
+NUM_LOCK_SHARDS = 16
+
+class ShardedRegistry(dict):
+    """Shared id -> name map. Plain reads and writes are single dict operations; compound operations like claim()
+    take one of NUM_LOCK_SHARDS locks picked by key, so unrelated keys never contend."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._locks = [threading.Lock() for _ in range(NUM_LOCK_SHARDS)]
+
+    def lockFor(self, key):
+        return self._locks[hash(key) % NUM_LOCK_SHARDS]
+
+    def claim(self, key, value):
+        """Sets key to value unless it is already present. Returns whether this caller set it."""
+        with self.lockFor(key):
+            if key in self:
+                return False
+            self[key] = value
+            return True
+
+class WorkerBuffer:
+    __slots__ = ('runs', 'recordRuns', 'levels', 'platforms', 'subcategories', 'subcategoryValues', 'subcategoryVariables')
+
+    def __init__(self):
+        self.runs = []
+        self.recordRuns = []
+        self.levels = {}
+        self.platforms = {}
+        self.subcategories = {}
+        self.subcategoryValues = {}
+        self.subcategoryVariables = {}
+
+class WorkerBuffers:
+    """Hands every thread its own WorkerBuffer to accumulate into without locking. drain() merges them into the
+    shared state and must only be called at a stage boundary, once the threads writing to them have been joined."""
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._buffers = [] # (thread, buffer)
+
+    def get(self):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = WorkerBuffer()
+            self._local.buffer = buffer
+            with self._lock:
+                self._buffers.append((threading.current_thread(), buffer))
+        return buffer
+
+    def drain(self, runs: list, recordRuns: list, levels: dict, platforms: dict, subcategories: dict, subcategoryValues: dict,
+              subcategoryVariables: dict):
+        with self._lock:
+            buffers = self._buffers
+            self._buffers = [(thread, buffer) for thread, buffer in buffers if thread.is_alive()]
+        for _, buffer in buffers:
+            runs.extend(buffer.runs)
+            recordRuns.extend(buffer.recordRuns)
+            levels.update(buffer.levels)
+            platforms.update(buffer.platforms)
+            subcategories.update(buffer.subcategories)
+            subcategoryValues.update(buffer.subcategoryValues)
+            subcategoryVariables.update(buffer.subcategoryVariables)
+            buffer.runs = []
+            buffer.recordRuns = []
+            buffer.levels = {}
+            buffer.platforms = {}
+            buffer.subcategories = {}
+            buffer.subcategoryValues = {}
+            buffer.subcategoryVariables = {}
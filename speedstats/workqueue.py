@@ -0,0 +1,157 @@
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+
+_log = logging.getLogger('SpeedStats-V2')
+
+LEASE_SECONDS = 300 # How long a claimed unit stays with its worker unless the worker extends the lease
+MAX_ATTEMPTS = 5 # Claims before a unit is given up on
+
+class LeaseQueue:
+    """Durable SQLite work queue with leases. Claiming a unit leases it to one worker, who extends the lease while it
+    works; a unit whose lease runs out before it is completed or failed can be claimed again, so a crashed worker only costs a timeout. Completion
+    requires the lease token, so a worker that lost its lease can't overwrite the result of the one that took over.
+
+    Units have a unique key (duplicates are ignored), a kind, a priority (lowest first), a JSON payload, an optional
+    group key to read results back by, and an opaque result blob set on completion.
+    """
+    def __init__(self, path: str, leaseSeconds: float = LEASE_SECONDS, maxAttempts: int = MAX_ATTEMPTS):
+        self.path = path
+        self.leaseSeconds = leaseSeconds
+        self.maxAttempts = maxAttempts
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(
+            """
+            PRAGMA journal_mode = WAL; -- Commits per completed unit stay cheap, and survive a coordinator crash
+            PRAGMA synchronous = NORMAL;
+            CREATE TABLE IF NOT EXISTS units (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT UNIQUE NOT NULL,
+                kind TEXT NOT NULL,
+                priority REAL NOT NULL,
+                groupKey TEXT,
+                payload TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                leaseToken TEXT,
+                leaseOwner TEXT,
+                leaseExpires REAL,
+                result BLOB
+            );
+            CREATE INDEX IF NOT EXISTS unitsByState ON units (state, priority, id);
+            CREATE INDEX IF NOT EXISTS unitsByGroup ON units (kind, groupKey);
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """)
+        self.conn.commit()
+
+    def insertUnits(self, units: list):
+        return self.conn.executemany(
+            "INSERT OR IGNORE INTO units (key, kind, priority, groupKey, payload) VALUES (?, ?, ?, ?, ?)", units).rowcount
+
+    def put(self, units: list):
+        """Adds (key, kind, priority, groupKey, payload) units, skipping keys already queued. Returns how many were added."""
+        with self.lock:
+            added = self.insertUnits(units)
+            self.conn.commit()
+        return added
+
+    def claim(self, owner: str):
+        """Leases the next unit to `owner`. Returns {'id', 'kind', 'payload', 'token'}, or None if nothing is claimable."""
+        now = time.time()
+        with self.lock:
+            expired = self.conn.execute("UPDATE units SET state = 'failed' WHERE state = 'leased' AND leaseExpires < ? AND attempts >= ?",
+                                        (now, self.maxAttempts)).rowcount
+            if expired > 0:
+                _log.warning(f"Gave up on {expired} units whose last lease expired")
+            row = self.conn.execute(
+                "SELECT id, kind, payload FROM units WHERE state = 'pending' OR (state = 'leased' AND leaseExpires < ?) "
+                "ORDER BY priority, id LIMIT 1", (now, )).fetchone()
+            if row is None:
+                self.conn.commit()
+                return None
+            unitId, kind, payload = row
+            token = uuid.uuid4().hex
+            self.conn.execute(
+                "UPDATE units SET state = 'leased', leaseToken = ?, leaseOwner = ?, leaseExpires = ?, attempts = attempts + 1 WHERE id = ?",
+                (token, owner, now + self.leaseSeconds, unitId))
+            self.conn.commit()
+        return {'id': unitId, 'kind': kind, 'payload': payload, 'token': token}
+
+    def complete(self, unitId: int, token: str, result: bytes = None, followUps: list = []):
+        """Marks a leased unit done with its result and queues its follow-up units in the same transaction. Returns
+        False, changing nothing, if the token no longer holds the lease."""
+        with self.lock:
+            updated = self.conn.execute(
+                "UPDATE units SET state = 'done', result = ?, leaseExpires = NULL WHERE id = ? AND state = 'leased' AND leaseToken = ?",
+                (result, unitId, token)).rowcount
+            if updated == 1:
+                self.insertUnits(followUps)
+            self.conn.commit()
+        return updated == 1
+
+    def extend(self, unitId: int, token: str):
+        """Renews a lease for another leaseSeconds. Returns False if the token no longer holds it."""
+        with self.lock:
+            updated = self.conn.execute("UPDATE units SET leaseExpires = ? WHERE id = ? AND state = 'leased' AND leaseToken = ?",
+                                        (time.time() + self.leaseSeconds, unitId, token)).rowcount
+            self.conn.commit()
+        return updated == 1
+
+    def fail(self, unitId: int, token: str):
+        """Returns a leased unit to the queue, or gives up on it once it used up its attempts."""
+        with self.lock:
+            updated = self.conn.execute(
+                "UPDATE units SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, leaseExpires = NULL "
+                "WHERE id = ? AND state = 'leased' AND leaseToken = ?", (self.maxAttempts, unitId, token)).rowcount
+            self.conn.commit()
+        return updated == 1
+
+    def counts(self):
+        with self.lock:
+            return dict(self.conn.execute("SELECT state, COUNT(*) FROM units GROUP BY state"))
+
+    def isDrained(self):
+        counts = self.counts()
+        return counts.get('pending', 0) == 0 and counts.get('leased', 0) == 0
+
+    def unit(self, unitId: int):
+        """Returns {'key', 'kind', 'groupKey', 'payload'} of a unit, or None."""
+        with self.lock:
+            row = self.conn.execute("SELECT key, kind, groupKey, payload FROM units WHERE id = ?", (unitId, )).fetchone()
+        return dict(zip(('key', 'kind', 'groupKey', 'payload'), row)) if row != None else None
+
+    def result(self, key: str):
+        with self.lock:
+            row = self.conn.execute("SELECT result FROM units WHERE key = ? AND state = 'done'", (key, )).fetchone()
+        return row[0] if row != None else None
+
+    def groupKeys(self, kind: str):
+        with self.lock:
+            return [row[0] for row in self.conn.execute(
+                "SELECT DISTINCT groupKey FROM units WHERE kind = ? AND state = 'done' ORDER BY groupKey", (kind, ))]
+
+    def groupResults(self, kind: str, groupKey: str):
+        """(payload, result) of the completed units of a kind in one group, in the order they were queued."""
+        with self.lock:
+            return self.conn.execute("SELECT payload, result FROM units WHERE kind = ? AND groupKey IS ? AND state = 'done' ORDER BY id",
+                                     (kind, groupKey)).fetchall()
+
+    def getSetting(self, key: str):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM settings WHERE key = ?", (key, )).fetchone()
+        return row[0] if row != None else None
+
+    def setSetting(self, key: str, value: str):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()